@@ -0,0 +1,296 @@
+import asyncio
+from time import monotonic
+from typing import AsyncIterator, Awaitable, Callable, NoReturn, Optional, TypeVar
+
+import aiohttp
+from ape.logging import logger
+
+from ape_subsquid.cache import BlockRangeCache, get_fingerprint
+from ape_subsquid.estimates import ThroughputModel
+from ape_subsquid.exceptions import ApeSubsquidError, DataRangeIsNotAvailable, WorkerIsUnavailable
+from ape_subsquid.gateway import (
+    RESPONSE_CHUNK_SIZE,
+    BaseGateway,
+    Block,
+    Query,
+    gateway,
+    get_gateway_error,
+)
+from ape_subsquid.parsing import DecodeError, loads
+from ape_subsquid.retry import get_retry_after
+from ape_subsquid.transport import TransferStats, get_accept_encoding, get_decoder
+
+T = TypeVar("T")
+
+
+class GatewayResponseError(Exception):
+    def __init__(self, status: int, text: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(f"{status}: {text}")
+        self.status = status
+        self.text = text
+        self.retry_after = retry_after
+
+
+# a truncated body fails to parse
+RETRYABLE_ERRORS = (
+    GatewayResponseError,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    DecodeError,
+    WorkerIsUnavailable,
+)
+
+
+class AsyncSubsquidGateway(BaseGateway):
+    """
+    Asyncio counterpart of :class:`~ape_subsquid.gateway.SubsquidGateway`.
+
+    All requests go through one pooled ``aiohttp`` session per event loop,
+    retry pauses, cache lookups and response decoding don't block the loop.
+    """
+
+    _timeout = aiohttp.ClientTimeout(sock_connect=10, sock_read=60)
+    # max number of open connections to the archive and its workers
+    _connections_limit = 100
+    _height_ttl = 30
+
+    def __init__(
+        self,
+        cache: Optional[BlockRangeCache] = None,
+        throughput: Optional[ThroughputModel] = None,
+    ) -> None:
+        super().__init__(cache, throughput)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker_slots: dict[str, asyncio.Semaphore] = {}
+        # network -> (height, time it was received)
+        self._heights: dict[str, tuple[int, float]] = {}
+        # (loop, network, query fingerprint) -> request being sent
+        self._in_flight: dict[tuple[asyncio.AbstractEventLoop, str, str], asyncio.Task] = {}
+
+    async def get_height(self, network: str, refresh: bool = False, **kwargs) -> int:
+        cached = self._heights.get(network)
+        if cached is not None and not refresh:
+            height, received_at = cached
+            if monotonic() - received_at < self._height_ttl:
+                return height
+
+        height = await self._retry(self._get_height, network, **kwargs)
+        self._heights[network] = (height, monotonic())
+        return height
+
+    async def query(self, network: str, query: Query, **kwargs) -> list[Block]:
+        """
+        Get the blocks of a single response. Identical queries awaited at once
+        are fetched once and share the result, which must not be mutated.
+        """
+        key = (asyncio.get_running_loop(), network, get_fingerprint(query))
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._get_blocks(network, query, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # a cancelled caller doesn't cancel the request the others wait for
+        return await asyncio.shield(task)
+
+    async def close(self):
+        session, loop = self._session, self._session_loop
+        self._session = None
+        if session is None or session.closed:
+            return
+
+        if loop is not None and loop.is_running() and loop is not asyncio.get_running_loop():
+            # connections can only be closed by the loop they belong to
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            await session.close()
+
+    async def _get_blocks(self, network: str, query: Query, **kwargs) -> list[Block]:
+        # the cache reads and writes files, keep them off the loop
+        cached, missing = await asyncio.to_thread(self._read_cache, network, query)
+        if missing is None:
+            return cached
+
+        data, stats = await self._retry(self._query, network, missing, **kwargs)
+        await asyncio.to_thread(self._record_chunk, network, missing, data, stats)
+        if self.cache is not None:
+            height = await self.get_height(network)
+            await asyncio.to_thread(self.cache.put, network, missing, data, height)
+        return cached + data if cached else data
+
+    async def _query(self, network: str, query: Query) -> tuple[list[Block], TransferStats]:
+        from_block = query["fromBlock"]
+        worker_url = self._get_known_worker(network, from_block)
+        if worker_url is not None:
+            try:
+                return await self._post(worker_url, query)
+            except RETRYABLE_ERRORS:
+                self._forget_worker(network, worker_url)
+
+        worker_url = await self._resolve_worker(network, from_block)
+        result = await self._post(worker_url, query)
+        self._workers.remember(network, from_block, worker_url)
+        return result
+
+    async def _post(self, worker_url: str, query: Query) -> tuple[list[Block], TransferStats]:
+        session = await self._get_session()
+        async with self._get_worker_slot(worker_url):
+            started = monotonic()
+            try:
+                with self._instrumentation.measure("gateway.response", worker=worker_url) as event:
+                    response = await session.post(worker_url, json=query)
+                    event["status"] = str(response.status)
+                async with response:
+                    await raise_for_status(response)
+                    data, stats = await self._read(response)
+            except RETRYABLE_ERRORS as e:
+                self._record_failure(worker_url, e)
+                raise
+            self._breaker.record_success(worker_url)
+            # retries and failed attempts are left out
+            stats.seconds = monotonic() - started
+            return data, stats
+
+    async def _read(self, response: aiohttp.ClientResponse) -> tuple[list[Block], TransferStats]:
+        stats = TransferStats(encoding=response.headers.get("Content-Encoding"))
+        with self._instrumentation.measure("gateway.read") as event:
+            # the session doesn't decompress bodies, so the received bytes can be counted
+            decoder = get_decoder(stats.encoding)
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(RESPONSE_CHUNK_SIZE):
+                stats.wire_size += len(chunk)
+                if decoder is not None:
+                    chunk = decoder.decompress(chunk)
+                body += chunk
+            if decoder is not None:
+                body += decoder.flush()
+            stats.size = len(body)
+            data = await asyncio.to_thread(loads, bytes(body))
+            event.update(size=stats.size, wire_size=stats.wire_size, encoding=stats.encoding)
+        self._record_transfer(stats)
+        return data, stats
+
+    async def _resolve_worker(self, network: str, start_block: int) -> str:
+        for _ in range(self._worker_resolutions):
+            worker_url = await self._get_worker(network, start_block)
+            if self._accept_worker(worker_url):
+                return worker_url
+        raise self._get_unavailable_error(worker_url)
+
+    async def _get_worker(self, network: str, start_block: int) -> str:
+        url = f"{self._archive_url}/network/{network}/{start_block}/worker"
+        with self._instrumentation.measure("gateway.worker", network=network) as event:
+            worker_url = await self._get_text(url)
+            event["worker"] = worker_url
+        return worker_url
+
+    async def _get_height(self, network: str) -> int:
+        url = f"{self._archive_url}/network/{network}/height"
+        return int(await self._get_text(url))
+
+    async def _get_text(self, url: str) -> str:
+        session = await self._get_session()
+        async with session.get(url) as response:
+            await raise_for_status(response)
+            return await read_text(response)
+
+    async def _retry(self, request: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        retries = 0
+        max_retries = kwargs.pop("max_retries", self._retry_policy.max_retries)
+        while True:
+            try:
+                return await request(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                pause = self._get_pause(e, retries, max_retries)
+                retries += 1
+                await asyncio.sleep(pause)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # a session is bound to the loop it was created in
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            await self.close()
+            connector = aiohttp.TCPConnector(limit=self._connections_limit)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self._timeout,
+                headers={"Accept-Encoding": get_accept_encoding()},
+                auto_decompress=False,
+            )
+            self._session_loop = loop
+            self._worker_slots.clear()
+        return self._session
+
+    def _get_worker_slot(self, worker_url: str) -> asyncio.Semaphore:
+        slot = self._worker_slots.get(worker_url)
+        if slot is None:
+            slot = asyncio.Semaphore(self._worker_requests_limit)
+            self._worker_slots[worker_url] = slot
+        return slot
+
+    def _get_status(self, error: Exception) -> Optional[int]:
+        return error.status if isinstance(error, GatewayResponseError) else None
+
+    def _get_retry_after(self, error: Exception) -> Optional[float]:
+        return error.retry_after if isinstance(error, GatewayResponseError) else None
+
+    def _raise_error(self, error: Exception) -> NoReturn:
+        if isinstance(error, GatewayResponseError):
+            raise get_gateway_error(error.text) from error
+        elif isinstance(error, ApeSubsquidError):
+            raise error
+        else:
+            raise ApeSubsquidError(f"Gateway request failed: {error!r}") from error
+
+
+async def raise_for_status(response: aiohttp.ClientResponse):
+    if response.status >= 400:
+        retry_after = get_retry_after(response.headers)
+        raise GatewayResponseError(response.status, await read_text(response), retry_after)
+
+
+async def read_text(response: aiohttp.ClientResponse) -> str:
+    body = await response.read()
+    decoder = get_decoder(response.headers.get("Content-Encoding"))
+    if decoder is not None:
+        body = decoder.decompress(body) + decoder.flush()
+    return body.decode()
+
+
+async def ensure_range_is_available_async(
+    gateway: AsyncSubsquidGateway, network: str, query: Query
+):
+    if "toBlock" not in query:
+        return
+
+    height = await gateway.get_height(network)
+    if query["toBlock"] > height:
+        # the cached height might be outdated
+        height = await gateway.get_height(network, refresh=True)
+    if query["toBlock"] > height:
+        range = (query["fromBlock"], query["toBlock"])
+        raise DataRangeIsNotAvailable(range, height)
+
+
+async def async_gateway_ingest(
+    gateway: AsyncSubsquidGateway, network: str, query: Query
+) -> AsyncIterator[list[Block]]:
+    """
+    Asynchronously iterate over the query result chunk by chunk.
+    """
+    await ensure_range_is_available_async(gateway, network, query)
+    query = query.copy()
+    while True:
+        data = await gateway.query(network, query)
+        yield data
+
+        last_block = data[-1]["header"]["number"]
+        logger.info(f"Done fetching the range ({query['fromBlock']}, {last_block})")
+        if "toBlock" in query:
+            if last_block == query["toBlock"]:
+                break
+
+        query["fromBlock"] = last_block + 1
+
+
+async_gateway = AsyncSubsquidGateway(throughput=gateway.throughput)
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import zlib
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Iterator, NamedTuple, Optional
+
+from ape.logging import logger
+
+from ape_subsquid.parsing import dumps, loads
+from ape_subsquid.utils import get_data_folder
+
+if TYPE_CHECKING:
+    from ape_subsquid.gateway import Block, Query
+
+
+class CacheHit(NamedTuple):
+    blocks: list["Block"]
+    # the last block covered by the segment, which the blocks may not reach
+    last_block: int
+
+
+class BlockRangeCache:
+    """
+    On-disk cache of finalized gateway responses.
+
+    Every response is stored as a segment covering the ``[fromBlock, last block]`` range
+    of the request. Segments are grouped by network and query shape, i.e.
+    the request without its block range. Least recently used segments are evicted
+    once the total size goes over ``max_size`` bytes.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_size: int = 2 * 1024**3,
+        finality_margin: int = 1000,
+    ) -> None:
+        self._path = path
+        self.max_size = max_size
+        self.finality_margin = finality_margin
+        self._size: Optional[int] = None
+        self._lock = Lock()
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            self._path = get_data_folder() / "cache"
+        return self._path
+
+    def get(self, network: str, query: "Query") -> Optional[CacheHit]:
+        """
+        Get cached blocks from ``query["fromBlock"]`` up to the end of a segment
+        containing it or ``query["toBlock"]``, whichever comes first.
+
+        Only blocks with matching data are stored, so a segment trimmed
+        at ``query["toBlock"]`` usually lacks that block. The caller has to complete
+        the response with it, since the last block tells where a response ends.
+        """
+        from_block = query["fromBlock"]
+        to_block = query.get("toBlock")
+        for start, end, file in self._segments(network, query):
+            if not start <= from_block <= end:
+                continue
+
+            try:
+                data = self._read(file)
+            except (OSError, ValueError, zlib.error):
+                logger.warning(f"Removing corrupted cache segment {file}")
+                self._remove(file)
+                return None
+
+            last_block = end if to_block is None else min(end, to_block)
+            blocks = [
+                block for block in data if from_block <= block["header"]["number"] <= last_block
+            ]
+            # keep track of the access time for eviction
+            os.utime(file)
+            return CacheHit(blocks, last_block)
+        return None
+
+    def next_segment_start(self, network: str, query: "Query") -> Optional[int]:
+        """
+        Get the first block of the closest segment following ``query["fromBlock"]``.
+        """
+        starts = [
+            start for start, _, _ in self._segments(network, query) if start > query["fromBlock"]
+        ]
+        return min(starts, default=None)
+
+    def put(self, network: str, query: "Query", data: list["Block"], height: int):
+        """
+        Store a response unless it reaches into the blocks which can still be reorganized
+        or a cached segment already covers it.
+        """
+        if not data:
+            return
+
+        start = query["fromBlock"]
+        end = data[-1]["header"]["number"]
+        if end > height - self.finality_margin:
+            return
+
+        segments = list(self._segments(network, query))
+        if any(first <= start and end <= last for first, last, _ in segments):
+            return
+
+        # segments within the new one are redundant
+        for first, last, file in segments:
+            if start <= first and last <= end:
+                self._remove(file)
+
+        directory = self._directory(network, query)
+        directory.mkdir(parents=True, exist_ok=True)
+        file = directory / f"{start}-{end}.bin"
+        content = zlib.compress(dumps(data))
+        tmp_file = file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_bytes(content)
+        os.replace(tmp_file, file)
+
+        with self._lock:
+            self._size = self._get_size() + len(content)
+            if self._size > self.max_size:
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            for file in self.path.rglob("*.bin"):
+                file.unlink(missing_ok=True)
+            self._size = 0
+
+    def _segments(self, network: str, query: "Query") -> Iterator[tuple[int, int, Path]]:
+        directory = self._directory(network, query)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+
+        for name in names:
+            if name.endswith(".bin"):
+                start, end = name[:-4].split("-")
+                yield int(start), int(end), directory / name
+
+    def _directory(self, network: str, query: "Query") -> Path:
+        shape = {key: value for key, value in query.items() if key not in ("fromBlock", "toBlock")}
+        return self.path / network / get_fingerprint(shape)
+
+    def _read(self, file: Path) -> list["Block"]:
+        return loads(zlib.decompress(file.read_bytes()))
+
+    def _remove(self, file: Path):
+        with self._lock:
+            try:
+                size = file.stat().st_size
+                file.unlink()
+            except FileNotFoundError:
+                return
+            if self._size is not None:
+                self._size -= size
+
+    def _get_size(self) -> int:
+        if self._size is None:
+            self._size = sum(file.stat().st_size for file in self.path.rglob("*.bin"))
+        return self._size
+
+    def _evict(self):
+        files = []
+        for file in self.path.rglob("*.bin"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, file in sorted(files, key=lambda item: item[0]):
+            if size <= self.max_size:
+                break
+            file.unlink(missing_ok=True)
+            size -= file_size
+        self._size = size
+
+
+def get_fingerprint(value: Any) -> str:
+    """
+    Get a stable hash of a query or its part,
+    the order of addresses and topics and their case don't matter.
+    """
+    normalized = json.dumps(_normalize(value), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(normalized.encode()).hexdigest()[:32]
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    elif isinstance(value, list):
+        items = [_normalize(item) for item in value]
+        if all(isinstance(item, str) for item in items):
+            return sorted(item.lower() for item in items)
+        return items
+    else:
+        return value
@@ -0,0 +1,59 @@
+from time import time
+from typing import TYPE_CHECKING, Optional
+
+from ape_subsquid.cache import get_fingerprint
+from ape_subsquid.storage import SqliteStore
+
+if TYPE_CHECKING:
+    from ape_subsquid.gateway import Query
+
+
+class CheckpointStore(SqliteStore):
+    """
+    Last blocks completed by long-running ingests, so an interrupted ingest
+    can be continued instead of started over.
+
+    Ingests are told apart by network and the fingerprint of the whole query,
+    including its original block range.
+    """
+
+    _file_name = "checkpoints.sqlite"
+    _schema = """
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            network TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            last_block INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (network, fingerprint)
+        );
+    """
+
+    def get(self, network: str, query: "Query") -> Optional[int]:
+        """
+        Get the last block completed by an ingest of ``query``.
+        """
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT last_block FROM checkpoints WHERE network = ? AND fingerprint = ?",
+                (network, get_fingerprint(query)),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, network: str, query: "Query", last_block: int):
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (network, fingerprint, last_block, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (network, get_fingerprint(query), last_block, time()),
+            )
+
+    def delete(self, network: str, query: "Query"):
+        with self.transaction() as connection:
+            connection.execute(
+                "DELETE FROM checkpoints WHERE network = ? AND fingerprint = ?",
+                (network, get_fingerprint(query)),
+            )
+
+    def clear(self):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM checkpoints")
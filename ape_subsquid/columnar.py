@@ -0,0 +1,187 @@
+from typing import Any, Callable, Iterable, Mapping, Optional, Sequence, Type, cast
+
+import pandas as pd
+from ape.api import BlockAPI, EcosystemAPI
+from ape.utils.abi import LogInputABICollection, Struct, is_array
+from eth_utils import encode_hex, keccak
+from ethpm_types.abi import EventABI
+from hexbytes import HexBytes
+
+from ape_subsquid.gateway import Block, BlockHeader, Log
+from ape_subsquid.mappings import map_header
+from ape_subsquid.utils import hex_to_int
+
+
+def _hex_to_int_or_zero(value: Any) -> int:
+    return 0 if value is None else hex_to_int(value)
+
+
+def _hex_to_int_or_none(value: Any) -> Optional[int]:
+    return None if value is None else hex_to_int(value)
+
+
+# raw header field and its converter per block column
+BLOCK_COLUMNS: dict[str, tuple[str, Callable[[Any], Any]]] = {
+    "hash": ("hash", str),
+    "number": ("number", int),
+    "parent_hash": ("parentHash", str),
+    "size": ("size", int),
+    "timestamp": ("timestamp", int),
+    "gas_limit": ("gasLimit", hex_to_int),
+    "gas_used": ("gasUsed", hex_to_int),
+    # blocks before London don't have a base fee
+    "base_fee": ("baseFeePerGas", _hex_to_int_or_none),
+    "difficulty": ("difficulty", _hex_to_int_or_zero),
+    "total_difficulty": ("totalDifficulty", _hex_to_int_or_zero),
+}
+
+# columns computed from other data rather than read from a header field
+BLOCK_DERIVED_COLUMNS = ("datetime", "num_transactions")
+
+EVENT_COLUMNS = (
+    "event_name",
+    "contract_address",
+    "event_arguments",
+    "transaction_hash",
+    "block_number",
+    "block_hash",
+    "log_index",
+    "transaction_index",
+)
+
+
+# a header with every field set, decoded to find the block model of an ecosystem
+EMPTY_HEADER: BlockHeader = {
+    "number": 0,
+    "hash": "0x" + "00" * 32,
+    "parentHash": "0x" + "00" * 32,
+    "size": 0,
+    "sha3Uncles": "0x" + "00" * 32,
+    "miner": "0x" + "00" * 20,
+    "stateRoot": "0x" + "00" * 32,
+    "transactionsRoot": "0x" + "00" * 32,
+    "receiptsRoot": "0x" + "00" * 32,
+    "logsBloom": "0x" + "00" * 256,
+    "difficulty": "0x0",
+    "totalDifficulty": "0x0",
+    "gasLimit": "0x0",
+    "gasUsed": "0x0",
+    "timestamp": 0,
+    "extraData": "0x",
+    "mixHash": "0x" + "00" * 32,
+    "nonce": "0x" + "00" * 8,
+    "baseFeePerGas": "0x0",
+}
+
+# ecosystem name -> block model
+_block_classes: dict[str, Type[BlockAPI]] = {}
+
+
+def get_block_class(ecosystem: EcosystemAPI) -> Type[BlockAPI]:
+    """
+    Get the block model of an ecosystem without asking the node for a block.
+    """
+    if ecosystem.name not in _block_classes:
+        block = ecosystem.decode_block(cast(dict, map_header(EMPTY_HEADER, [])))
+        _block_classes[ecosystem.name] = block.__class__
+    return _block_classes[ecosystem.name]
+
+
+def supports_block_columns(columns: Iterable[str]) -> bool:
+    return all(column in BLOCK_COLUMNS or column in BLOCK_DERIVED_COLUMNS for column in columns)
+
+
+def supports_event_columns(columns: Iterable[str]) -> bool:
+    return all(column in EVENT_COLUMNS for column in columns)
+
+
+def blocks_to_frame(chunks: Iterable[list[Block]], columns: Sequence[str]) -> pd.DataFrame:
+    """
+    Fill in block columns straight from the gateway responses.
+    Hashes are kept as hex strings.
+    """
+    data: dict[str, list] = {column: [] for column in columns}
+    timestamps: list[int] = []
+    for chunk in chunks:
+        headers: list[Mapping[str, Any]] = [block["header"] for block in chunk]
+        for column in columns:
+            if column in BLOCK_COLUMNS:
+                field, convert = BLOCK_COLUMNS[column]
+                data[column].extend(convert(header[field]) for header in headers)
+            elif column == "num_transactions":
+                data[column].extend(len(block.get("transactions", [])) for block in chunk)
+        if "datetime" in data:
+            timestamps.extend(int(header["timestamp"]) for header in headers)
+
+    frame = pd.DataFrame({column: data[column] for column in columns if column != "datetime"})
+    if "datetime" in data:
+        frame["datetime"] = pd.to_datetime(timestamps, unit="s", utc=True)
+    return frame[list(columns)]
+
+
+def logs_to_frame(
+    chunks: Iterable[list[Block]],
+    event: EventABI,
+    columns: Sequence[str],
+    ecosystem: EcosystemAPI,
+) -> pd.DataFrame:
+    """
+    Fill in event columns straight from the gateway responses.
+    Only ``event_arguments`` are decoded per row, hashes are kept as hex strings.
+    """
+    abi = LogInputABICollection(event)
+    selector = encode_hex(keccak(text=event.selector))
+    addresses: dict[str, Any] = {}
+    getters: dict[str, Callable[[Log, Any], Any]] = {
+        "event_name": lambda log, header: abi.event_name,
+        "contract_address": lambda log, header: _decode_address(
+            log["address"], addresses, ecosystem
+        ),
+        "event_arguments": lambda log, header: _decode_arguments(log, abi, addresses, ecosystem),
+        "transaction_hash": lambda log, header: log["transactionHash"],
+        "block_number": lambda log, header: header["number"],
+        "block_hash": lambda log, header: header["hash"],
+        "log_index": lambda log, header: log["logIndex"],
+        "transaction_index": lambda log, header: log["transactionIndex"],
+    }
+    data: dict[str, list] = {column: [] for column in columns}
+    selected = [(data[column], getters[column]) for column in columns]
+    for chunk in chunks:
+        for block in chunk:
+            header = block["header"]
+            for log in block.get("logs", []):
+                if not log["topics"] or log["topics"][0] != selector:
+                    continue
+
+                for values, get in selected:
+                    values.append(get(log, header))
+
+    return pd.DataFrame(data, columns=list(columns))
+
+
+def _decode_arguments(
+    log: Log, abi: LogInputABICollection, addresses: dict[str, Any], ecosystem: EcosystemAPI
+) -> dict:
+    # the same conversions as in ``Ethereum.decode_logs``
+    arguments = abi.decode(log["topics"], log["data"], use_hex_on_fail=True)
+    for item in abi.abi.inputs:
+        _type, value = item.canonical_type, arguments[item.name]
+        if isinstance(value, Struct):
+            struct_types = _type.lstrip("(").rstrip(")").split(",")
+            for struct_type, (struct_key, struct_value) in zip(struct_types, value.items()):
+                if struct_type == "address":
+                    value[struct_key] = _decode_address(struct_value, addresses, ecosystem)
+                elif "bytes" in struct_type:
+                    value[struct_key] = HexBytes(struct_value)
+        elif _type == "address":
+            arguments[item.name] = _decode_address(value, addresses, ecosystem)
+        elif is_array(_type) and "[".join(_type.split("[")[:-1]) == "address":
+            arguments[item.name] = [_decode_address(v, addresses, ecosystem) for v in value]
+    return arguments
+
+
+def _decode_address(value: Any, addresses: dict[str, Any], ecosystem: EcosystemAPI) -> Any:
+    # the same contracts and accounts repeat a lot, so checksums are computed once
+    if value not in addresses:
+        addresses[value] = ecosystem.decode_address(value)
+    return addresses[value]
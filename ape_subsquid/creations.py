@@ -0,0 +1,109 @@
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TypedDict
+
+from hexbytes import HexBytes
+
+from ape_subsquid.fields import receipt_fields, receipt_needs_logs
+from ape_subsquid.gateway import Block, Log, Transaction, TxFieldSelection
+from ape_subsquid.mappings import BlockReceipts, ReceiptRecord, map_log, map_receipt
+from ape_subsquid.parsing import dumps, loads
+from ape_subsquid.storage import SqliteStore
+
+
+class ContractCreation(TypedDict):
+    blockNumber: int
+    blockHash: str
+    transaction: Transaction
+    # transaction fields selected when the creation was fetched
+    fields: list[str]
+    # ``None`` if the logs weren't requested
+    logs: Optional[list[Log]]
+
+
+class CreationCache(SqliteStore):
+    """
+    Transactions which created contracts, keyed by the contract address.
+
+    Only the creations older than ``finality_margin`` blocks are stored
+    as they can't change anymore.
+    """
+
+    _file_name = "creations.sqlite"
+    _schema = """
+        CREATE TABLE IF NOT EXISTS creations (
+            network TEXT NOT NULL,
+            address TEXT NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (network, address)
+        );
+    """
+
+    def __init__(self, path: Optional[Path] = None, finality_margin: int = 1000) -> None:
+        super().__init__(path)
+        self.finality_margin = finality_margin
+
+    def get(self, network: str, address: str) -> Optional[ContractCreation]:
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT data FROM creations WHERE network = ? AND address = ?",
+                (network, address.lower()),
+            ).fetchone()
+        return None if row is None else loads(row[0])
+
+    def put(self, network: str, creations: Iterable[tuple[str, ContractCreation]], height: int):
+        """
+        Store ``(address, creation)`` pairs unless their blocks can still be reorganized.
+        """
+        rows = [
+            (network, address.lower(), dumps(creation))
+            for address, creation in creations
+            if creation["blockNumber"] <= height - self.finality_margin
+        ]
+        if not rows:
+            return
+
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO creations (network, address, data) VALUES (?, ?, ?)", rows
+            )
+
+    def clear(self):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM creations")
+
+
+def get_block_creations(
+    block: Block, fields: TxFieldSelection, with_logs: bool
+) -> Iterator[tuple[str, ContractCreation]]:
+    """
+    Get the contracts created in a block along with their creation transactions.
+    """
+    receipts = BlockReceipts(block)
+    selected = sorted(fields)
+    for trace in block.get("traces", []):
+        index = trace["transactionIndex"]
+        creation: ContractCreation = {
+            "blockNumber": receipts.number,
+            "blockHash": block["header"]["hash"],
+            "transaction": receipts.transactions[index],
+            "fields": selected,
+            "logs": receipts.logs.get(index, []) if with_logs else None,
+        }
+        yield trace["result"]["address"], creation
+
+
+def creation_has_columns(creation: ContractCreation, columns: Iterable[str]) -> bool:
+    """
+    Check if the stored creation has all the fields backing the receipt ``columns``.
+    """
+    columns = list(columns)
+    if creation["logs"] is None and receipt_needs_logs(columns):
+        return False
+    return set(receipt_fields(columns)) <= set(creation["fields"])
+
+
+def get_creation_receipt(creation: ContractCreation) -> ReceiptRecord:
+    block_number = creation["blockNumber"]
+    block_hash = HexBytes(creation["blockHash"])
+    logs = [map_log(log, block_number, block_hash) for log in creation["logs"] or []]
+    return map_receipt(creation["transaction"], block_number, block_hash, logs)
@@ -0,0 +1,123 @@
+import atexit
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, cast
+
+from ape.types import ContractLog
+from ethpm_types.abi import EventABI
+
+from ape_subsquid.metrics import Instrumentation, instrumentation
+
+if TYPE_CHECKING:
+    from ape.api import EcosystemAPI
+
+    from ape_subsquid.mappings import LogRecord
+
+
+class ParallelLogDecoder:
+    """
+    Decodes logs in a pool of processes, as ABI decoding of big ranges is bound by CPU.
+
+    Batches of logs are sent as they come, regardless of the blocks and chunks
+    they span. At most two batches per process are in flight,
+    so a long ingest isn't buffered in memory. Results are yielded in the order of logs.
+
+    The pool is started with the first batch and shut down by :meth:`close`
+    or when the interpreter exits.
+    """
+
+    def __init__(self, processes: int, instrumentation: Instrumentation = instrumentation) -> None:
+        self.processes = processes
+        self._instrumentation = instrumentation
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+
+    def decode(
+        self, ecosystem: str, batches: Iterable[list["LogRecord"]], event: EventABI
+    ) -> Iterator[ContractLog]:
+        executor = self._get_executor()
+        pending: deque[Future[list[ContractLog]]] = deque()
+        try:
+            for batch in batches:
+                pending.append(executor.submit(decode_logs, ecosystem, batch, event))
+                if len(pending) >= 2 * self.processes:
+                    yield from self._wait(pending.popleft())
+
+            while pending:
+                yield from self._wait(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _wait(self, future: "Future[list[ContractLog]]") -> list[ContractLog]:
+        # the time waited for a batch is the decoding time seen by the consumer
+        with self._instrumentation.measure("engine.decode", query="event") as event:
+            decoded = future.result()
+            event.update(rows=len(decoded))
+        return decoded
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+                atexit.unregister(self.close)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # forking a process with running ingest threads might copy held locks
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(self.processes, mp_context=context)
+                atexit.register(self.close)
+            return self._executor
+
+
+def batch_logs(
+    chunks: Iterable[tuple[list["LogRecord"], int]],
+    size: int,
+    max_seconds: float,
+    max_blocks: int,
+) -> Iterator[list["LogRecord"]]:
+    """
+    Group the logs of consecutive chunks, given with their last blocks,
+    into batches of ``size`` logs. A partial batch is yielded at the end of a chunk
+    once its first log waited ``max_seconds`` or ``max_blocks`` blocks passed since it.
+    """
+    pending: list["LogRecord"] = []
+    first_seen = 0.0
+    for logs, last_block in chunks:
+        for log in logs:
+            if not pending:
+                first_seen = monotonic()
+            pending.append(log)
+            if len(pending) == size:
+                yield pending
+                pending = []
+
+        if pending and (
+            monotonic() - first_seen >= max_seconds
+            or last_block - pending[0]["blockNumber"] >= max_blocks
+        ):
+            yield pending
+            pending = []
+
+    if pending:
+        yield pending
+
+
+def decode_logs(ecosystem: str, logs: list["LogRecord"], event: EventABI) -> list[ContractLog]:
+    # records are mappings, ecosystems don't need actual dicts
+    return list(get_ecosystem(ecosystem).decode_logs(cast(list[dict], logs), event))
+
+
+@lru_cache
+def get_ecosystem(name: str) -> "EcosystemAPI":
+    # plugins are loaded once per worker process
+    from ape import networks
+
+    return networks.get_ecosystem(name)
@@ -0,0 +1,199 @@
+import atexit
+import math
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from time import monotonic
+from typing import TYPE_CHECKING, Optional
+
+from ape_subsquid.storage import SqliteStore
+
+if TYPE_CHECKING:
+    from ape_subsquid.gateway import LogRequest, Query
+
+
+@dataclass
+class ChunkStats:
+    """
+    Exponentially weighted averages of the measured gateway responses.
+    """
+
+    latency: float
+    """Seconds spent on the successful request of a chunk."""
+
+    blocks: float
+    """Blocks covered by a chunk."""
+
+    size: float = 0.0
+    """Decoded bytes of a chunk."""
+
+    samples: int = 1
+
+
+class ThroughputModel(SqliteStore):
+    """
+    Gateway throughput measured per network and kind of query.
+
+    Every new measurement gets the ``decay`` weight, so the model follows
+    the current archive performance. Chunks cut short by the end of the query
+    only tell that chunks span at least as many blocks, so they are
+    left out unless they are longer than the average. The model is kept in memory and
+    the changes are written to the database at most every ``flush_interval``
+    seconds and at exit to be reused across sessions.
+    """
+
+    _file_name = "estimates.sqlite"
+    # replaces the chunk_stats table, which had no size column
+    _schema = """
+        CREATE TABLE IF NOT EXISTS chunk_measurements (
+            network TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            latency REAL NOT NULL,
+            blocks REAL NOT NULL,
+            size REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (network, kind)
+        );
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        decay: float = 0.2,
+        min_samples: int = 3,
+        flush_interval: float = 30.0,
+    ):
+        super().__init__(path)
+        self.decay = decay
+        self.min_samples = min_samples
+        self.flush_interval = flush_interval
+        self._stats: Optional[dict[tuple[str, str], ChunkStats]] = None
+        # keys of the stats changed since the last flush
+        self._changed: set[tuple[str, str]] = set()
+        self._flushed_at = monotonic()
+        atexit.register(self.flush)
+
+    def get(self, network: str, kind: str) -> Optional[ChunkStats]:
+        with self.transaction() as connection:
+            return self._load(connection).get((network, kind))
+
+    def record(
+        self,
+        network: str,
+        query: "Query",
+        blocks: int,
+        latency: float,
+        size: int = 0,
+        truncated: bool = False,
+    ):
+        """
+        Add a measured chunk, ``truncated`` if it ended at the last block of the query.
+        """
+        key = (network, get_query_kind(query))
+        with self.transaction() as connection:
+            models = self._load(connection)
+            stats = models.get(key)
+            if stats is None:
+                stats = models[key] = ChunkStats(latency, blocks, size)
+            elif truncated and blocks < stats.blocks:
+                return
+            else:
+                stats.latency += self.decay * (latency - stats.latency)
+                stats.blocks += self.decay * (blocks - stats.blocks)
+                stats.size += self.decay * (size - stats.size)
+                stats.samples += 1
+
+            self._changed.add(key)
+            if monotonic() - self._flushed_at >= self.flush_interval:
+                self._write(connection)
+
+    def estimate(self, network: str, kind: str, blocks: int, concurrency: int = 1) -> Optional[int]:
+        """
+        Estimate milliseconds needed to get ``blocks`` blocks of a query
+        with ``concurrency`` chunks fetched at once
+        or ``None`` if there are not enough measurements yet.
+        """
+        stats = self.get(network, kind)
+        if stats is None or stats.samples < self.min_samples:
+            return None
+
+        chunks = math.ceil(max(blocks, 1) / max(stats.blocks, 1))
+        rounds = math.ceil(chunks / max(concurrency, 1))
+        return int(rounds * stats.latency * 1000)
+
+    def flush(self):
+        """
+        Write the stats changed since the last flush to the database.
+        """
+        if not self._changed:
+            return
+
+        with self.transaction() as connection:
+            self._write(connection)
+
+    def close(self):
+        self.flush()
+        super().close()
+
+    def clear(self):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM chunk_measurements")
+            self._stats = {}
+            self._changed.clear()
+
+    def _load(self, connection: sqlite3.Connection) -> dict[tuple[str, str], ChunkStats]:
+        if self._stats is None:
+            rows = connection.execute(
+                "SELECT network, kind, latency, blocks, size, samples FROM chunk_measurements"
+            ).fetchall()
+            self._stats = {
+                (network, kind): ChunkStats(latency, blocks, size, samples)
+                for network, kind, latency, blocks, size, samples in rows
+            }
+        return self._stats
+
+    def _write(self, connection: sqlite3.Connection):
+        models = self._load(connection)
+        connection.executemany(
+            "INSERT OR REPLACE INTO chunk_measurements "
+            "(network, kind, latency, blocks, size, samples) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (network, kind, stats.latency, stats.blocks, stats.size, stats.samples)
+                for (network, kind), stats in ((key, models[key]) for key in self._changed)
+            ],
+        )
+        self._changed.clear()
+        self._flushed_at = monotonic()
+
+
+def get_query_kind(query: "Query") -> str:
+    """
+    Get the most selective kind of items requested by a query,
+    the blocks per chunk mostly depend on it.
+
+    Log queries are told apart by the number of topic filters
+    of their least selective request, e.g. ``logs/1``.
+    """
+    if query.get("traces"):
+        return "traces"
+    if query.get("logs"):
+        topics = min(
+            sum(1 for topic in get_topic_filters(request) if topic) for request in query["logs"]
+        )
+        return f"logs/{topics}"
+    # block queries ask for the transaction count with an empty request
+    if any(query.get("transactions", [])):
+        return "transactions"
+    return "blocks"
+
+
+def get_topic_filters(request: "LogRequest") -> tuple[Optional[list[str]], ...]:
+    """
+    Get the topic filters of a log request by position, ``None`` matches any topic.
+    """
+    return (
+        request.get("topic0"),
+        request.get("topic1"),
+        request.get("topic2"),
+        request.get("topic3"),
+    )
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from ape.exceptions import ApeException
 
 
@@ -26,3 +28,15 @@ class DataRangeIsNotAvailable(ApeSubsquidError):
 
     def __init__(self, range: tuple[int, int], height: int) -> None:
         super().__init__(f"Range {range} isn't covered. Last available block is {height}.")
+
+
+class WorkerIsUnavailable(ApeSubsquidError):
+    """
+    Raised when the worker assigned to a block range keeps failing.
+    """
+
+    def __init__(self, worker: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(f"Worker {worker} keeps failing.")
+        self.worker = worker
+        # seconds until the worker can be tried again
+        self.retry_after = retry_after
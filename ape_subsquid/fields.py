@@ -0,0 +1,94 @@
+from typing import Iterable, Type, TypeVar, cast
+
+from ape_subsquid.gateway import BlockFieldSelection, LogFieldSelection, TxFieldSelection
+
+T = TypeVar("T")
+
+# gateway fields backing the columns of a block
+BLOCK_COLUMNS: dict[str, tuple[str, ...]] = {
+    "hash": ("hash",),
+    "number": ("number",),
+    "parent_hash": ("parentHash",),
+    "size": ("size",),
+    "timestamp": ("timestamp",),
+    "datetime": ("timestamp",),
+    "gas_limit": ("gasLimit",),
+    "gas_used": ("gasUsed",),
+    "base_fee": ("baseFeePerGas",),
+    "difficulty": ("difficulty",),
+    "total_difficulty": ("totalDifficulty",),
+    "num_transactions": (),
+}
+
+# fields the ecosystem can't decode a block without
+BLOCK_REQUIRED_FIELDS = ("number", "hash", "timestamp", "gasLimit", "gasUsed")
+
+# gateway fields backing the columns of a receipt, ``logs`` are selected separately
+RECEIPT_COLUMNS: dict[str, tuple[str, ...]] = {
+    "block_number": (),
+    "contract_address": ("contractAddress",),
+    "gas_used": ("gasUsed",),
+    "logs": (),
+    "status": ("status",),
+    "txn_hash": ("hash",),
+    "transaction": tuple(TxFieldSelection.__annotations__),
+}
+
+# fields the ecosystem can't decode a receipt and its transaction without
+RECEIPT_REQUIRED_FIELDS = (
+    "transactionIndex",
+    "hash",
+    "nonce",
+    "from",
+    "to",
+    "type",
+    "status",
+    "gas",
+    "gasPrice",
+    "gasUsed",
+    "maxFeePerGas",
+    "maxPriorityFeePerGas",
+    "value",
+    "chainId",
+    "contractAddress",
+)
+
+
+def all_fields(cls: Type[T]) -> T:
+    return cast(T, {field: True for field in cls.__annotations__})
+
+
+def select_fields(
+    cls: Type[T],
+    columns: Iterable[str],
+    column_fields: dict[str, tuple[str, ...]],
+    required_fields: Iterable[str],
+) -> T:
+    """
+    Get the minimal selection of ``cls`` fields covering the ``columns``.
+    All the fields are selected if some column isn't known.
+    """
+    selected = set(required_fields)
+    for column in columns:
+        if column not in column_fields:
+            return all_fields(cls)
+        selected.update(column_fields[column])
+
+    return cast(T, {field: True for field in cls.__annotations__ if field in selected})
+
+
+def block_fields(columns: Iterable[str]) -> BlockFieldSelection:
+    return select_fields(BlockFieldSelection, columns, BLOCK_COLUMNS, BLOCK_REQUIRED_FIELDS)
+
+
+def receipt_fields(columns: Iterable[str]) -> TxFieldSelection:
+    return select_fields(TxFieldSelection, columns, RECEIPT_COLUMNS, RECEIPT_REQUIRED_FIELDS)
+
+
+def receipt_needs_logs(columns: Iterable[str]) -> bool:
+    return any(column not in RECEIPT_COLUMNS or column == "logs" for column in columns)
+
+
+def log_fields() -> LogFieldSelection:
+    # the ecosystem needs every log field for decoding
+    return all_fields(LogFieldSelection)
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from time import monotonic, sleep
+from typing import TYPE_CHECKING, Callable, Iterator, Optional, Sequence, TypeVar
+
+from ape.logging import logger
+
+if TYPE_CHECKING:
+    from ape_subsquid.gateway import Block, Query, SubsquidGateway
+
+T = TypeVar("T")
+
+
+@dataclass
+class FollowCursor:
+    """
+    Position of a followed query. Store ``next_block`` and pass it back
+    to resume following without receiving the delivered blocks again.
+    """
+
+    next_block: int
+    """First block whose items were not all yielded yet."""
+
+
+@dataclass
+class PollingPolicy:
+    """
+    How often the archive height is polled once the history is ingested.
+
+    The interval follows the observed pace of new blocks and grows
+    by ``backoff`` with every poll which finds no new blocks.
+    """
+
+    min_interval: float = 1.0
+    max_interval: float = 30.0
+    backoff: float = 1.5
+
+    def get_interval(self, interval: float, seconds: float, new_blocks: int) -> float:
+        """
+        Get the pause before the next poll given the last one and ``new_blocks``
+        which arrived within ``seconds``.
+        """
+        if new_blocks:
+            interval = seconds / new_blocks
+        else:
+            interval *= self.backoff
+        return min(max(interval, self.min_interval), self.max_interval)
+
+
+def gateway_follow(
+    gateway: "SubsquidGateway",
+    network: str,
+    query: "Query",
+    policy: Optional[PollingPolicy] = None,
+    **kwargs,
+) -> Iterator[list["Block"]]:
+    """
+    Iterate over the query result chunk by chunk from ``query["fromBlock"]``
+    up to the archive height and then over the newly covered ranges as the height advances.
+    ``query["toBlock"]`` is ignored, the iteration only ends when it is closed.
+
+    Every range is fetched once. Other keyword arguments go to ``gateway_ingest``.
+    """
+    # fix circular import
+    from ape_subsquid.query import gateway_ingest
+
+    policy = policy or PollingPolicy()
+    next_block = query["fromBlock"]
+    interval = policy.min_interval
+    advanced_at = monotonic()
+    while True:
+        height = gateway.get_height(network, refresh=True)
+        new_blocks = max(height - next_block + 1, 0)
+        if new_blocks:
+            q = query.copy()
+            q["fromBlock"] = next_block
+            q["toBlock"] = height
+            for data in gateway_ingest(gateway, network, q, **kwargs):
+                next_block = data[-1]["header"]["number"] + 1
+                yield data
+
+        now = monotonic()
+        interval = policy.get_interval(interval, now - advanced_at, new_blocks)
+        if new_blocks:
+            advanced_at = now
+        logger.debug(f"Followed {network} up to block {next_block - 1}, next poll in {interval}s")
+        sleep(interval)
+
+
+def iter_chunk(
+    items: Sequence[T],
+    last_block: int,
+    cursor: FollowCursor,
+    get_block_number: Callable[[T], int],
+) -> Iterator[T]:
+    """
+    Yield the items of a chunk ending at ``last_block`` moving ``cursor`` past
+    a block right before the last item of that block is yielded.
+    """
+    for index, item in enumerate(items):
+        if index + 1 == len(items):
+            cursor.next_block = last_block + 1
+        else:
+            block_number = get_block_number(item)
+            if get_block_number(items[index + 1]) != block_number:
+                cursor.next_block = block_number + 1
+        yield item
+
+    # blocks of the chunk without items
+    cursor.next_block = last_block + 1
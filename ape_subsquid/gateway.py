@@ -1,11 +1,25 @@
-from time import sleep
-from typing import Callable, Literal, Optional, TypedDict, TypeVar, Union
+from concurrent.futures import Future
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from time import monotonic, sleep
+from typing import Callable, Literal, NoReturn, Optional, TypedDict, TypeVar, Union
 
 from ape.logging import logger
-from requests import Session
-from requests.exceptions import HTTPError
-
-from ape_subsquid.exceptions import ApeSubsquidError, DataIsNotAvailable, NotReadyToServeError
+from requests import Response
+from requests.exceptions import ChunkedEncodingError, ConnectionError, HTTPError, Timeout
+
+from ape_subsquid.cache import BlockRangeCache, get_fingerprint
+from ape_subsquid.estimates import ThroughputModel, get_query_kind
+from ape_subsquid.exceptions import (
+    ApeSubsquidError,
+    DataIsNotAvailable,
+    NotReadyToServeError,
+    WorkerIsUnavailable,
+)
+from ape_subsquid.metrics import instrumentation
+from ape_subsquid.parsing import DecodeError, loads
+from ape_subsquid.retry import CircuitBreaker, RetryPolicy, get_retry_after
+from ape_subsquid.transport import TransferCounter, TransferStats, create_session, iter_body
 from ape_subsquid.utils import ttl_cache
 
 TraceType = Union[Literal["create"], Literal["call"], Literal["reward"], Literal["suicide"]]
@@ -235,72 +249,388 @@ class Block(TypedDict, total=False):
 
 T = TypeVar("T")
 
+ARCHIVE_URL = "https://v2.archive.subsquid.io"
+RESPONSE_CHUNK_SIZE = 256 * 1024
+# a truncated body fails to parse
+RETRYABLE_ERRORS = (
+    HTTPError,
+    ConnectionError,
+    Timeout,
+    ChunkedEncodingError,
+    DecodeError,
+    WorkerIsUnavailable,
+)
 
-class SubsquidGateway:
-    _session = Session()
-    _retry_schedule = [5, 10, 20, 30, 60]
 
-    @ttl_cache(seconds=30)
+class WorkerRegistry:
+    """
+    Remembers which worker served a chunk starting at a given block,
+    so the following chunks can be sent to it without resolving a worker again.
+    """
+
+    def __init__(self, limit: int = 16) -> None:
+        self.limit = limit
+        # network -> [(first served block, worker url)]
+        self._workers: dict[str, list[tuple[int, str]]] = {}
+        self._lock = Lock()
+
+    def get(self, network: str, block: int) -> Optional[str]:
+        with self._lock:
+            workers = self._workers.get(network, [])
+            candidates = [(start, url) for start, url in workers if start <= block]
+            if candidates:
+                return max(candidates)[1]
+        return None
+
+    def remember(self, network: str, start_block: int, worker_url: str):
+        with self._lock:
+            workers = self._workers.setdefault(network, [])
+            workers.append((start_block, worker_url))
+            del workers[: -self.limit]
+
+    def forget(self, network: str, worker_url: str):
+        with self._lock:
+            workers = self._workers.get(network, [])
+            workers[:] = [(start, url) for start, url in workers if url != worker_url]
+
+
+class BaseGateway:
+    """
+    Worker resolution, retries, caching and measurements shared by
+    :class:`SubsquidGateway` and the asyncio gateway, which only differ in
+    how requests are sent and how retries are waited out.
+    """
+
+    _archive_url = ARCHIVE_URL
+    _retry_policy = RetryPolicy()
+    _instrumentation = instrumentation
+    # max number of data requests sent to the same worker at once, parallel sub-ranges
+    # of a query served by one worker are fetched no faster than that
+    _worker_requests_limit = 2
+    # worker lookups made to find one whose circuit isn't open
+    _worker_resolutions = 3
+
+    def __init__(
+        self,
+        cache: Optional[BlockRangeCache] = None,
+        throughput: Optional[ThroughputModel] = None,
+    ) -> None:
+        self.cache = cache
+        self.throughput = throughput
+        self._workers = WorkerRegistry()
+        self._breaker = CircuitBreaker()
+        self.transfer = TransferCounter()
+
+    def _get_known_worker(self, network: str, start_block: int) -> Optional[str]:
+        """
+        Get the worker which served the previous chunks unless its circuit is open.
+        """
+        worker_url = self._workers.get(network, start_block)
+        if worker_url is not None and self._breaker.is_open(worker_url):
+            return None
+        return worker_url
+
+    def _forget_worker(self, network: str, worker_url: str):
+        logger.debug(f"Worker {worker_url} failed, resolving a new one")
+        self._workers.forget(network, worker_url)
+
+    def _accept_worker(self, worker_url: str) -> bool:
+        if self._breaker.is_open(worker_url):
+            logger.debug(f"Worker {worker_url} keeps failing, resolving another one")
+            return False
+        return True
+
+    def _get_unavailable_error(self, worker_url: str) -> WorkerIsUnavailable:
+        # come back when the worker can be tried again
+        return WorkerIsUnavailable(worker_url, self._breaker.get_reset_in(worker_url))
+
+    def _record_failure(self, worker_url: str, error: Exception):
+        if self._retry_policy.should_retry(self._get_status(error)):
+            self._breaker.record_failure(worker_url)
+
+    def _get_pause(self, error: Exception, retries: int, max_retries: int) -> float:
+        """
+        Get the seconds to wait before retrying a failed request,
+        the error is raised if the request can't be retried.
+        """
+        status = self._get_status(error)
+        if not self._retry_policy.should_retry(status) or retries >= max_retries:
+            self._raise_error(error)
+
+        if isinstance(error, WorkerIsUnavailable):
+            retry_after = error.retry_after
+        else:
+            retry_after = self._get_retry_after(error)
+        pause = self._retry_policy.get_pause(retries, retry_after)
+        self._instrumentation.emit(
+            "gateway.retry",
+            attempt=retries + 1,
+            status=str(status) if status is not None else type(error).__name__,
+            pause=pause,
+        )
+        logger.warning(f"Gateway request failed ({error!r}), will retry in {pause} secs")
+        return pause
+
+    def _read_cache(self, network: str, query: Query) -> tuple[list[Block], Optional[Query]]:
+        """
+        Get the cached blocks of a query and the query of the blocks
+        still to be fetched, ``None`` if the cache has all of them.
+        """
+        if self.cache is None:
+            return [], query
+
+        hit = self.cache.get(network, query)
+        if hit is not None:
+            if hit.blocks and hit.blocks[-1]["header"]["number"] == hit.last_block:
+                return hit.blocks, None
+            # a response always ends with the header of its last block
+            return hit.blocks, get_end_query(query, hit.last_block)
+
+        # fetch only the gap before the next cached segment
+        next_segment_start = self.cache.next_segment_start(network, query)
+        to_block = query.get("toBlock")
+        if next_segment_start is not None and (to_block is None or next_segment_start <= to_block):
+            query = query.copy()
+            query["toBlock"] = next_segment_start - 1
+        return [], query
+
+    def _record_chunk(self, network: str, query: Query, data: list[Block], stats: TransferStats):
+        if not data or (self.throughput is None and not self._instrumentation.enabled):
+            return
+
+        last_block = data[-1]["header"]["number"]
+        blocks = last_block - query["fromBlock"] + 1
+        if self.throughput is not None:
+            truncated = last_block == query.get("toBlock")
+            self.throughput.record(network, query, blocks, stats.seconds, stats.size, truncated)
+        self._instrumentation.emit(
+            "gateway.chunk",
+            network=network,
+            kind=get_query_kind(query),
+            blocks=blocks,
+            seconds=stats.seconds,
+            size=stats.size,
+            wire_size=stats.wire_size,
+        )
+
+    def _record_transfer(self, stats: TransferStats):
+        self.transfer.add(stats)
+        logger.debug(
+            f"Received {stats.wire_size} bytes ({stats.encoding or 'identity'}), "
+            f"compression ratio {stats.compression_ratio:.1f}"
+        )
+
+    def _get_status(self, error: Exception) -> Optional[int]:
+        """
+        Get the status of a failed response, ``None`` if there was no response.
+        """
+        raise NotImplementedError
+
+    def _get_retry_after(self, error: Exception) -> Optional[float]:
+        raise NotImplementedError
+
+    def _raise_error(self, error: Exception) -> NoReturn:
+        raise NotImplementedError
+
+
+class SubsquidGateway(BaseGateway):
+    _session = create_session()
+    # seconds to connect and to wait for the next bytes of a response
+    _timeout = (10, 60)
+
+    def __init__(
+        self,
+        cache: Optional[BlockRangeCache] = None,
+        throughput: Optional[ThroughputModel] = None,
+    ) -> None:
+        super().__init__(cache, throughput)
+        self._worker_slots: dict[str, BoundedSemaphore] = {}
+        self._worker_slots_lock = Lock()
+        # (network, query fingerprint) -> result of the request being sent
+        self._in_flight: dict[tuple[str, str], Future[list[Block]]] = {}
+        self._in_flight_lock = Lock()
+
+    @ttl_cache(seconds=30, stale_seconds=600, ignore=("max_retries",))
     def get_height(self, network: str, **kwargs) -> int:
         return self._retry(self._get_height, network, **kwargs)
 
     def query(self, network: str, query: Query, **kwargs) -> list[Block]:
-        return self._retry(self._query, network, query, **kwargs)
+        """
+        Get the blocks of a single response. Identical queries sent from several threads
+        at once are fetched once and share the result, which must not be mutated.
+        """
+        key = (network, get_fingerprint(query))
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if future is None:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            data = self._get_blocks(network, query, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(data)
+            return data
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+
+    def _get_blocks(self, network: str, query: Query, **kwargs) -> list[Block]:
+        cached, missing = self._read_cache(network, query)
+        if missing is None:
+            return cached
+
+        data = self._fetch(network, missing, **kwargs)
+        if self.cache is not None:
+            self.cache.put(network, missing, data, self.get_height(network))
+        return cached + data if cached else data
+
+    def _fetch(self, network: str, query: Query, **kwargs) -> list[Block]:
+        data, stats = self._retry(self._query, network, query, **kwargs)
+        self._record_chunk(network, query, data, stats)
+        return data
+
+    def _query(self, network: str, query: Query) -> tuple[list[Block], TransferStats]:
+        return self._send(network, query, self._read)
+
+    def _send(self, network: str, query: Query, read: Callable[[Response], T]) -> T:
+        from_block = query["fromBlock"]
+        worker_url = self._get_known_worker(network, from_block)
+        if worker_url is not None:
+            try:
+                return self._post(worker_url, query, read)
+            except RETRYABLE_ERRORS:
+                self._forget_worker(network, worker_url)
 
-    def _query(self, network: str, query: Query) -> list[Block]:
-        worker_url = self._get_worker(network, query["fromBlock"])
-        response = self._session.post(worker_url, json=query)
-        response.raise_for_status()
-        return response.json()
+        worker_url = self._resolve_worker(network, from_block)
+        result = self._post(worker_url, query, read)
+        self._workers.remember(network, from_block, worker_url)
+        return result
+
+    def _post(self, worker_url: str, query: Query, read: Callable[[Response], T]) -> T:
+        with self._worker_slot(worker_url):
+            try:
+                with self._instrumentation.measure("gateway.response", worker=worker_url) as event:
+                    response = self._session.post(
+                        worker_url, json=query, stream=True, timeout=self._timeout
+                    )
+                    event["status"] = str(response.status_code)
+                if not response.ok:
+                    # load the error text before the connection is released
+                    response.content
+                response.raise_for_status()
+                result = read(response)
+            except RETRYABLE_ERRORS as e:
+                self._record_failure(worker_url, e)
+                raise
+            self._breaker.record_success(worker_url)
+            return result
+
+    def _read(self, response: Response) -> tuple[list[Block], TransferStats]:
+        stats = TransferStats()
+        started = monotonic()
+        with self._instrumentation.measure("gateway.read") as event:
+            with response:
+                body = b"".join(iter_body(response, RESPONSE_CHUNK_SIZE, stats))
+            data = loads(body)
+            event.update(size=stats.size, wire_size=stats.wire_size, encoding=stats.encoding)
+        # retries and failed attempts are left out
+        stats.seconds = response.elapsed.total_seconds() + monotonic() - started
+        self._record_transfer(stats)
+        return data, stats
+
+    @contextmanager
+    def _worker_slot(self, worker_url: str):
+        with self._worker_slots_lock:
+            slot = self._worker_slots.get(worker_url)
+            if slot is None:
+                slot = BoundedSemaphore(self._worker_requests_limit)
+                self._worker_slots[worker_url] = slot
+
+        with slot:
+            yield
+
+    def _resolve_worker(self, network: str, start_block: int) -> str:
+        for _ in range(self._worker_resolutions):
+            worker_url = self._get_worker(network, start_block)
+            if self._accept_worker(worker_url):
+                return worker_url
+        raise self._get_unavailable_error(worker_url)
 
     def _get_worker(self, network: str, start_block: int) -> str:
-        url = f"https://v2.archive.subsquid.io/network/{network}/{start_block}/worker"
-        response = self._session.get(url)
-        response.raise_for_status()
+        url = f"{self._archive_url}/network/{network}/{start_block}/worker"
+        with self._instrumentation.measure("gateway.worker", network=network) as event:
+            response = self._session.get(url, timeout=self._timeout)
+            response.raise_for_status()
+            event["worker"] = response.text
         return response.text
 
     def _get_height(self, network: str) -> int:
-        url = f"https://v2.archive.subsquid.io/network/{network}/height"
-        response = self._session.get(url)
+        url = f"{self._archive_url}/network/{network}/height"
+        response = self._session.get(url, timeout=self._timeout)
         response.raise_for_status()
         return int(response.text)
 
     def _retry(self, request: Callable[..., T], *args, **kwargs) -> T:
         retries = 0
-        max_retries = kwargs.pop("max_retries", len(self._retry_schedule))
+        max_retries = kwargs.pop("max_retries", self._retry_policy.max_retries)
         while True:
             try:
-                response = request(*args, **kwargs)
-            except HTTPError as e:
-                if self._is_retryable_error(e) and retries < max_retries:
-                    pause = self._get_retry_pause(retries)
-                    retries += 1
-                    logger.warning(f"Gateway request failed, will retry in {pause} secs")
-                    sleep(pause)
-                else:
-                    self._raise_error(e)
-            else:
-                return response
-
-    def _get_retry_pause(self, retries: int) -> int:
-        if retries < len(self._retry_schedule):
-            return self._retry_schedule[retries]
-        else:
-            return self._retry_schedule[-1]
-
-    def _is_retryable_error(self, error: HTTPError) -> bool:
-        assert error.response is not None
-        return error.response.status_code == 503
-
-    def _raise_error(self, error: HTTPError) -> ApeSubsquidError:
-        assert error.response is not None
-        text = error.response.text
-        if "Not ready to serve block" in text:
-            raise NotReadyToServeError(text)
-        elif "Is not available" in text:
-            raise DataIsNotAvailable(text)
+                return request(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                pause = self._get_pause(e, retries, max_retries)
+                retries += 1
+                sleep(pause)
+
+    def _get_status(self, error: Exception) -> Optional[int]:
+        return get_status(error)
+
+    def _get_retry_after(self, error: Exception) -> Optional[float]:
+        if isinstance(error, HTTPError) and error.response is not None:
+            return get_retry_after(error.response.headers)
+        return None
+
+    def _raise_error(self, error: Exception) -> NoReturn:
+        if isinstance(error, HTTPError) and error.response is not None:
+            raise get_gateway_error(error.response.text) from error
+        elif isinstance(error, ApeSubsquidError):
+            raise error
         else:
-            raise ApeSubsquidError(text)
+            raise ApeSubsquidError(f"Gateway request failed: {error}") from error
+
+
+def get_status(error: Exception) -> Optional[int]:
+    """
+    Get the status of a failed response, ``None`` if there was no response.
+    """
+    if isinstance(error, HTTPError) and error.response is not None:
+        return error.response.status_code
+    return None
+
+
+def get_gateway_error(text: str) -> ApeSubsquidError:
+    if "Not ready to serve block" in text:
+        return NotReadyToServeError(text)
+    elif "Is not available" in text:
+        return DataIsNotAvailable(text)
+    else:
+        return ApeSubsquidError(text)
+
+
+def get_end_query(query: Query, block: int) -> Query:
+    """
+    Get a query of the single ``block`` which completes a trimmed cache hit.
+    """
+    end_query = query.copy()
+    end_query["fromBlock"] = block
+    end_query["toBlock"] = block
+    return end_query
 
 
-gateway = SubsquidGateway()
+gateway = SubsquidGateway(throughput=ThroughputModel())
@@ -1,79 +1,197 @@
+from typing import Any, Callable, Iterator, Mapping, MutableMapping, Optional
+
 from hexbytes import HexBytes
 
-from ape_subsquid.gateway import BlockHeader, Log, Transaction
+from ape_subsquid.gateway import Block, BlockHeader, Log, Transaction
 from ape_subsquid.utils import hex_to_int
 
+HEADER_FIELDS: dict[str, Optional[Callable]] = {
+    "number": None,
+    "hash": HexBytes,
+    "parentHash": HexBytes,
+    "baseFeePerGas": hex_to_int,
+    "difficulty": hex_to_int,
+    "totalDifficulty": hex_to_int,
+    "extraData": HexBytes,
+    "gasLimit": hex_to_int,
+    "gasUsed": hex_to_int,
+    "logsBloom": HexBytes,
+    "miner": None,
+    "mixHash": HexBytes,
+    "nonce": HexBytes,
+    "receiptsRoot": HexBytes,
+    "sha3Uncles": HexBytes,
+    "size": None,
+    "stateRoot": HexBytes,
+    "timestamp": int,
+    "transactionsRoot": HexBytes,
+}
+
+RECEIPT_FIELDS: dict[str, Optional[Callable]] = {
+    "from": None,
+    "to": None,
+    "hash": HexBytes,
+    "status": None,
+    "chainId": None,
+    "contractAddress": None,
+    "cumulativeGasUsed": hex_to_int,
+    "effectiveGasPrice": hex_to_int,
+    "gas": hex_to_int,
+    "gasPrice": hex_to_int,
+    "gasUsed": hex_to_int,
+    "input": HexBytes,
+    "maxFeePerGas": hex_to_int,
+    "maxPriorityFeePerGas": hex_to_int,
+    "nonce": None,
+    "v": hex_to_int,
+    "r": HexBytes,
+    "s": HexBytes,
+    "transactionIndex": None,
+    "type": None,
+    "value": hex_to_int,
+    "yParity": None,
+}
+
+LOG_FIELDS: dict[str, Optional[Callable]] = {
+    "address": None,
+    "transactionIndex": None,
+    "transactionHash": HexBytes,
+    "logIndex": None,
+    "data": HexBytes,
+    "topics": lambda topics: [HexBytes(topic) for topic in topics],
+}
+
+
+class Record(MutableMapping[str, Any]):
+    """
+    Lazily converted view of a gateway item.
+
+    The raw item isn't copied, its fields are converted on the first access only.
+    Fields which are set or deleted shadow the raw ones,
+    so records can be handed to the ecosystem decoders which modify their input.
+    """
+
+    __slots__ = ("_raw", "_values")
+
+    # converters of the gateway fields, fields missing from the item are skipped
+    converters: dict[str, Optional[Callable]] = {}
+
+    def __init__(self, raw: Mapping[str, Any], **values: Any) -> None:
+        self._raw = raw
+        self._values = values
+
+    def __getitem__(self, key: str) -> Any:
+        values = self._values
+        if key in values:
+            value = values[key]
+            if value is _DELETED:
+                raise KeyError(key)
+            return value
+
+        if key in self.converters and key in self._raw:
+            value = self._raw[key]
+            convert = self.converters[key]
+            if value is not None and convert is not None:
+                value = convert(value)
+            values[key] = value
+            return value
+
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        self._values[key] = value
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self._values[key] = _DELETED
+
+    def __contains__(self, key: object) -> bool:
+        values = self._values
+        if key in values:
+            return values[key] is not _DELETED
+        return key in self.converters and key in self._raw
+
+    def __iter__(self) -> Iterator[str]:
+        values = self._values
+        for key in self.converters:
+            if key in self._raw and key not in values:
+                yield key
+        for key, value in values.items():
+            if value is not _DELETED:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({dict(self)})"
 
-def map_header(value: BlockHeader, transactions: list[Transaction]) -> dict:
-    return {
-        "number": value["number"],
-        "hash": HexBytes(value["hash"]),
-        "parentHash": HexBytes(value["parentHash"]),
-        "baseFeePerGas": value["baseFeePerGas"] and hex_to_int(value["baseFeePerGas"]),
-        "difficulty": hex_to_int(value["difficulty"]),
-        "totalDifficulty": hex_to_int(value["totalDifficulty"]),
-        "extraData": HexBytes(value["extraData"]),
-        "gasLimit": hex_to_int(value["gasLimit"]),
-        "gasUsed": hex_to_int(value["gasUsed"]),
-        "logsBloom": HexBytes(value["logsBloom"]),
-        "miner": value["miner"],
-        "mixHash": HexBytes(value["mixHash"]),
-        "nonce": HexBytes(value["nonce"]),
-        "receiptsRoot": HexBytes(value["receiptsRoot"]),
-        "sha3Uncles": HexBytes(value["sha3Uncles"]),
-        "size": value["size"],
-        "stateRoot": HexBytes(value["stateRoot"]),
-        "timestamp": int(value["timestamp"]),
-        "transactionsRoot": HexBytes(value["transactionsRoot"]),
-        "transactions": transactions,
-    }
+
+# marks the raw fields deleted from a record
+_DELETED = object()
+
+
+class HeaderRecord(Record):
+    __slots__ = ()
+    converters = HEADER_FIELDS
+
+
+class ReceiptRecord(Record):
+    __slots__ = ()
+    converters = RECEIPT_FIELDS
+
+
+class LogRecord(Record):
+    __slots__ = ()
+    converters = LOG_FIELDS
+
+
+def map_header(value: BlockHeader, transactions: list[Transaction]) -> HeaderRecord:
+    return HeaderRecord(value, transactions=transactions)
 
 
 def map_receipt(
     value: Transaction,
     block_number: int,
     block_hash: HexBytes,
-    logs: list[dict],
-) -> dict:
-    return {
-        "blockNumber": block_number,
-        "blockHash": block_hash,
-        "from": value["from"],
-        "to": value["to"],
-        "hash": HexBytes(value["hash"]),
-        "status": value["status"],
-        "chainId": value["chainId"],
-        "contractAddress": value["contractAddress"],
-        "cumulativeGasUsed": hex_to_int(value["cumulativeGasUsed"]),
-        "effectiveGasPrice": hex_to_int(value["effectiveGasPrice"]),
-        "gas": hex_to_int(value["gas"]),
-        "gasPrice": hex_to_int(value["gasPrice"]),
-        "gasUsed": hex_to_int(value["gasUsed"]),
-        "input": HexBytes(value["input"]),
-        "maxFeePerGas": value["maxFeePerGas"] and hex_to_int(value["maxFeePerGas"]),
-        "maxPriorityFeePerGas": value["maxPriorityFeePerGas"]
-        and hex_to_int(value["maxPriorityFeePerGas"]),
-        "nonce": value["nonce"],
-        "v": hex_to_int(value["v"]),
-        "r": HexBytes(value["r"]),
-        "s": HexBytes(value["s"]),
-        "transactionIndex": value["transactionIndex"],
-        "type": value["type"],
-        "value": hex_to_int(value["value"]),
-        "yParity": value["yParity"],
-        "transactionHash": HexBytes(value["hash"]),
-        "logs": logs,
-    }
-
-
-def map_log(value: Log, block_number: int, block_hash: HexBytes) -> dict:
-    return {
-        "blockNumber": block_number,
-        "blockHash": block_hash,
-        "address": value["address"],
-        "transactionIndex": value["transactionIndex"],
-        "transactionHash": HexBytes(value["transactionHash"]),
-        "logIndex": value["logIndex"],
-        "data": HexBytes(value["data"]),
-        "topics": [HexBytes(topic) for topic in value["topics"]],
-    }
+    logs: list[LogRecord],
+) -> ReceiptRecord:
+    record = ReceiptRecord(value, blockNumber=block_number, blockHash=block_hash, logs=logs)
+    if "hash" in value:
+        record["transactionHash"] = record["hash"]
+    return record
+
+
+def map_log(value: Log, block_number: int, block_hash: HexBytes) -> LogRecord:
+    return LogRecord(value, blockNumber=block_number, blockHash=block_hash)
+
+
+class BlockReceipts:
+    """
+    Assembles receipts of a single block.
+
+    Transactions and logs are grouped by ``transactionIndex`` once per block,
+    so looking up the logs of a transaction doesn't scan all the block logs.
+    """
+
+    def __init__(self, block: Block) -> None:
+        self.number = block["header"]["number"]
+        self.hash = HexBytes(block["header"]["hash"])
+        self.transactions = {tx["transactionIndex"]: tx for tx in block.get("transactions", [])}
+        self.logs: dict[int, list[Log]] = {}
+        for log in block.get("logs", []):
+            self.logs.setdefault(log["transactionIndex"], []).append(log)
+
+    def get_receipt(self, tx: Transaction) -> ReceiptRecord:
+        logs = [
+            map_log(log, self.number, self.hash)
+            for log in self.logs.get(tx["transactionIndex"], [])
+        ]
+        return map_receipt(tx, self.number, self.hash, logs)
+
+
+def map_block_logs(block: Block) -> list[LogRecord]:
+    block_number = block["header"]["number"]
+    block_hash = HexBytes(block["header"]["hash"])
+    return [map_log(log, block_number, block_hash) for log in block.get("logs", [])]
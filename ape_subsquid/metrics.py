@@ -0,0 +1,192 @@
+import json
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Iterator, Optional
+
+from ape.logging import logger
+
+# receives the event name and its fields
+Hook = Callable[[str, dict[str, Any]], None]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Instrumentation:
+    """
+    Dispatches measurements of the gateway and the query engine to the registered hooks.
+
+    Nothing is measured while there are no hooks, so the disabled instrumentation
+    costs a single check per chunk.
+
+    Events measured over a block which raised have an ``error`` field. Events:
+
+    - ``gateway.worker``: a worker was resolved (``network``, ``worker``, ``seconds``)
+    - ``gateway.response``: a worker responded (``worker``, ``status``, ``seconds`` till headers)
+    - ``gateway.read``: a response body was read and parsed
+      (``seconds``, ``size``, ``wire_size``, ``encoding``)
+    - ``gateway.retry``: a request is going to be retried
+      (``attempt``, ``status`` or the error name, ``pause``)
+    - ``gateway.chunk``: a chunk was fetched including retries
+      (``network``, ``kind``, ``blocks``, ``seconds``, ``size``, ``wire_size``)
+    - ``engine.map``, ``engine.decode``: a chunk was converted to the ecosystem format
+      and decoded (``query``, ``blocks``, ``rows``, ``seconds``), event logs are decoded
+      in batches spanning chunks, so their ``engine.decode`` has no ``blocks``
+    """
+
+    def __init__(self) -> None:
+        self._hooks: tuple[Hook, ...] = ()
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._hooks)
+
+    def add_hook(self, hook: Hook):
+        with self._lock:
+            self._hooks = (*self._hooks, hook)
+
+    def remove_hook(self, hook: Hook):
+        with self._lock:
+            self._hooks = tuple(item for item in self._hooks if item is not hook)
+
+    def emit(self, event: str, **fields):
+        for hook in self._hooks:
+            try:
+                hook(event, fields)
+            except Exception as e:
+                # broken metrics must not break queries
+                logger.debug(f"Instrumentation hook {hook} failed: {e}")
+
+    @contextmanager
+    def measure(self, event: str, **fields) -> Iterator[dict[str, Any]]:
+        """
+        Emit ``event`` with the ``seconds`` spent in the block.
+        More fields can be added to the yielded dict.
+        If the block raises, the event gets the exception name as ``error``.
+        """
+        if not self._hooks:
+            yield fields
+            return
+
+        started = perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            self.emit(event, seconds=perf_counter() - started, **fields)
+
+
+class PrometheusExporter:
+    """
+    Aggregates events into Prometheus counters and histograms.
+
+    Every event increments ``subsquid_<event>_total``, its ``seconds`` go into
+    the ``subsquid_<event>_seconds`` histogram and other numeric fields
+    are summed into ``subsquid_<event>_<field>_total`` counters.
+    String fields become labels except for ``excluded_labels``, worker URLs
+    are left out by default since every archive range has its own.
+    """
+
+    def __init__(
+        self,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        excluded_labels: tuple[str, ...] = ("worker",),
+    ) -> None:
+        self.buckets = buckets
+        self.excluded_labels = excluded_labels
+        self._counters: dict[tuple[str, tuple], float] = {}
+        # (name, labels) -> (bucket counts, sum, count)
+        self._histograms: dict[tuple[str, tuple], tuple[list[int], float, int]] = {}
+        self._lock = Lock()
+
+    def __call__(self, event: str, fields: dict[str, Any]):
+        name = "subsquid_" + event.replace(".", "_")
+        labels = tuple(
+            sorted(
+                (key, value)
+                for key, value in fields.items()
+                if isinstance(value, str) and key not in self.excluded_labels
+            )
+        )
+        with self._lock:
+            self._increment(f"{name}_total", labels, 1)
+            for key, value in fields.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                elif key == "seconds":
+                    self._observe(f"{name}_seconds", labels, value)
+                else:
+                    self._increment(f"{name}_{key}_total", labels, value)
+
+    def render(self) -> str:
+        """
+        Get the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (key, labels), value in sorted(self._counters.items()):
+                    if key == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (key, labels), (counts, total, count) in sorted(self._histograms.items()):
+                    if key != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        cumulative += bucket_count
+                        bucket_labels = _format_labels((*labels, ("le", str(bound))))
+                        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                    inf_labels = _format_labels((*labels, ("le", "+Inf")))
+                    lines.append(f"{name}_bucket{inf_labels} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def _increment(self, name: str, labels: tuple, value: float):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe(self, name: str, labels: tuple, value: float):
+        key = (name, labels)
+        counts, total, count = self._histograms.get(key, ([0] * len(self.buckets), 0.0, 0))
+        index = bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] += 1
+        self._histograms[key] = (counts, total + value, count + 1)
+
+
+class LogSink:
+    """
+    Writes every event as a JSON line to a logger.
+    """
+
+    def __init__(self, log: Optional[logging.Logger] = None, level: int = logging.DEBUG) -> None:
+        self.log = log or logging.getLogger("ape_subsquid.metrics")
+        self.level = level
+
+    def __call__(self, event: str, fields: dict[str, Any]):
+        if self.log.isEnabledFor(self.level):
+            self.log.log(self.level, json.dumps({"event": event, **fields}, default=str))
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    items = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + items + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+instrumentation = Instrumentation()
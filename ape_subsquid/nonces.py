@@ -0,0 +1,99 @@
+from pathlib import Path
+from typing import Callable, Optional
+
+from ape.logging import logger
+
+from ape_subsquid.storage import SqliteStore
+
+
+class NonceIndex(SqliteStore):
+    """
+    Blocks where transactions of an account with a given nonce landed.
+
+    Nonces grow with blocks, so the block of the closest known nonce
+    below the requested one is a safe place to start scanning from.
+    Only the transactions older than ``finality_margin`` blocks are recorded.
+    """
+
+    _file_name = "nonces.sqlite"
+    _schema = """
+        CREATE TABLE IF NOT EXISTS nonces (
+            network TEXT NOT NULL,
+            account TEXT NOT NULL,
+            nonce INTEGER NOT NULL,
+            block INTEGER NOT NULL,
+            PRIMARY KEY (network, account, nonce)
+        );
+    """
+
+    def __init__(self, path: Optional[Path] = None, finality_margin: int = 1000) -> None:
+        super().__init__(path)
+        self.finality_margin = finality_margin
+
+    def get_closest(self, network: str, account: str, nonce: int) -> Optional[tuple[int, int]]:
+        """
+        Get the highest indexed nonce not above ``nonce`` and its block.
+        """
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT nonce, block FROM nonces WHERE network = ? AND account = ? AND nonce <= ? "
+                "ORDER BY nonce DESC LIMIT 1",
+                (network, account.lower(), nonce),
+            ).fetchone()
+        return None if row is None else (row[0], row[1])
+
+    def put(self, network: str, account: str, nonces: list[tuple[int, int]], height: int):
+        """
+        Record ``(nonce, block)`` pairs unless the blocks can still be reorganized.
+        """
+        final = [
+            (nonce, block) for nonce, block in nonces if block <= height - self.finality_margin
+        ]
+        if not final:
+            return
+
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO nonces (network, account, nonce, block) "
+                "VALUES (?, ?, ?, ?)",
+                [(network, account.lower(), nonce, block) for nonce, block in final],
+            )
+
+    def clear(self):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM nonces")
+
+
+def bisect_nonce_block(
+    get_nonce: Callable[[int], int],
+    nonce: int,
+    start_block: int,
+    stop_block: int,
+    resolution: int,
+    max_steps: int,
+) -> int:
+    """
+    Coarsely find a block before the transaction with ``nonce``
+    using the account nonce at a given block, i.e. the number of its transactions so far.
+
+    The search stops once the range is narrower than ``resolution`` blocks
+    or after ``max_steps`` lookups, a failed lookup stops it as well.
+    """
+    low, high = start_block, stop_block
+    for _ in range(max_steps):
+        if high - low <= resolution:
+            break
+
+        middle = (low + high) // 2
+        try:
+            sent = get_nonce(middle)
+        except Exception as e:
+            # historical state is only available on archive nodes
+            logger.debug(f"Nonce lookup at block {middle} failed: {e}")
+            break
+
+        if sent > nonce:
+            high = middle
+        else:
+            low = middle
+    return low
@@ -0,0 +1,19 @@
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:
+    # orjson doesn't have wheels for every platform
+    orjson = None  # type: ignore[assignment]
+
+loads: Callable[[bytes], Any] = orjson.loads if orjson is not None else json.loads
+
+# raised by both decoders, orjson's error subclasses it
+DecodeError = json.JSONDecodeError
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
@@ -1,5 +1,10 @@
-from typing import Iterator, Optional, Type, TypeVar, cast
+import asyncio
+import math
+from collections import deque
+from functools import partial
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterable, Iterator, Optional, Sequence, cast
 
+import pandas as pd
 from ape.api import BlockAPI, ReceiptAPI
 from ape.api.query import (
     AccountTransactionQuery,
@@ -8,29 +13,97 @@ from ape.api.query import (
     ContractEventQuery,
     QueryAPI,
     QueryType,
+    extract_fields,
+    validate_and_expand_columns,
 )
 from ape.exceptions import QueryEngineError
 from ape.logging import logger
-from ape.types import ContractLog
+from ape.types import ContractLog, LogFilter
 from ape.utils import singledispatchmethod
-from hexbytes import HexBytes
 
+from ape_subsquid.checkpoints import CheckpointStore
+from ape_subsquid.columnar import (
+    blocks_to_frame,
+    get_block_class,
+    logs_to_frame,
+    supports_block_columns,
+    supports_event_columns,
+)
+from ape_subsquid.creations import (
+    ContractCreation,
+    CreationCache,
+    creation_has_columns,
+    get_block_creations,
+    get_creation_receipt,
+)
+from ape_subsquid.decoding import ParallelLogDecoder, batch_logs
+from ape_subsquid.estimates import get_query_kind, get_topic_filters
 from ape_subsquid.exceptions import DataRangeIsNotAvailable
+from ape_subsquid.fields import (
+    all_fields,
+    block_fields,
+    log_fields,
+    receipt_fields,
+    receipt_needs_logs,
+)
+from ape_subsquid.follow import FollowCursor, PollingPolicy, gateway_follow, iter_chunk
 from ape_subsquid.gateway import (
     Block,
     BlockFieldSelection,
-    LogFieldSelection,
+    Log,
+    LogRequest,
     Query,
     SubsquidGateway,
     TxFieldSelection,
     gateway,
 )
-from ape_subsquid.mappings import map_header, map_log, map_receipt
+from ape_subsquid.mappings import BlockReceipts, LogRecord, map_block_logs, map_header
+from ape_subsquid.metrics import instrumentation
 from ape_subsquid.networks import get_network
+from ape_subsquid.nonces import NonceIndex, bisect_nonce_block
+from ape_subsquid.utils import (
+    BackgroundIterator,
+    batched,
+    iterate_in_background,
+    split_overlapping_ranges,
+    split_range,
+)
+
+if TYPE_CHECKING:
+    from ape_subsquid.aio import AsyncSubsquidGateway
 
 
 class SubsquidQueryEngine(QueryAPI):
     _gateway = gateway
+    # the shared ``ape_subsquid.aio.async_gateway`` is used if not set
+    _async_gateway: Optional["AsyncSubsquidGateway"] = None
+    _instrumentation = instrumentation
+    _nonce_index = NonceIndex()
+    _creation_cache = CreationCache()
+    _checkpoints = CheckpointStore()
+    # max number of addresses looked up by a single trace scan
+    _creation_batch_size = 1000
+    # lookups of historical account nonces done to find where a cold account scan starts
+    _nonce_bisection_steps = 16
+    # ranges narrower than that are scanned rather than bisected further
+    _nonce_bisection_resolution = 100_000
+    # network -> whether the provider answered the last historical nonce lookup
+    _historical_state: dict[str, bool] = {}
+    # number of chunks downloaded ahead of the one being decoded
+    _prefetch = 2
+    # number of sub-ranges fetched in parallel for bounded queries, neighbouring sub-ranges
+    # are often served by the same worker, which takes `_worker_requests_limit` at once
+    _concurrency = 4
+    _polling_policy = PollingPolicy()
+    # processes decoding event logs, decoding happens in the querying thread if disabled
+    _decode_processes = 0
+    # logs decoded at once, batches span blocks and chunks
+    _decode_batch_size = 5000
+    # a partial batch is decoded at the end of a chunk once it waited that long
+    # or spans that many blocks, so sparse queries keep yielding
+    _decode_batch_seconds = 1.0
+    _decode_batch_blocks = 10_000
+    _log_decoder: Optional[ParallelLogDecoder] = None
 
     @singledispatchmethod
     def estimate_query(self, query: QueryType) -> Optional[int]:  # type: ignore[override]
@@ -42,13 +115,31 @@ class SubsquidQueryEngine(QueryAPI):
         if not block_is_available(self._gateway, network, query.stop_block):
             return None
 
-        return 100 + (query.stop_block - query.start_block) * 4
+        blocks = query.stop_block - query.start_block
+        return self._estimate(network, "blocks", blocks, default=100 + blocks * 4)
 
     @estimate_query.register
-    def estimate_account_transaction_query(self, query: AccountTransactionQuery) -> int:
-        # the entire network can be scanned in a worst-case scenario
-        # so just high value is used (10 min)
-        return 1000 * 60 * 10
+    def estimate_account_transaction_query(self, query: AccountTransactionQuery) -> Optional[int]:
+        network = get_network(self.network_manager)
+        try:
+            height = self._gateway.get_height(network, max_retries=0)
+        except Exception:
+            return None
+
+        closest = self._nonce_index.get_closest(network, query.account, query.start_nonce)
+        start_block = 0 if closest is None else closest[1]
+        blocks = max(height - start_block, 0)
+        exact = closest is not None and closest[0] == query.start_nonce
+        if exact or not self._historical_state.get(network, False):
+            # without historical state the bisection stops right away
+            return self._estimate(network, "transactions", blocks, default=400 + blocks // 32)
+
+        # every bisection step is a node request halving the range to scan
+        steps = self._nonce_bisection_steps
+        blocks = max(blocks >> steps, min(blocks, self._nonce_bisection_resolution))
+        return steps * 50 + self._estimate(
+            network, "transactions", blocks, default=400 + blocks // 32
+        )
 
     @estimate_query.register
     def estimate_contract_creation_query(self, query: ContractCreationQuery) -> Optional[int]:
@@ -56,7 +147,8 @@ class SubsquidQueryEngine(QueryAPI):
         if not block_is_available(self._gateway, network, query.stop_block):
             return None
 
-        return 100 + (query.stop_block - query.start_block) * 5
+        blocks = query.stop_block - query.start_block
+        return self._estimate(network, "traces", blocks, default=100 + blocks * 5)
 
     @estimate_query.register
     def estimate_contract_event_query(self, query: ContractEventQuery) -> Optional[int]:
@@ -64,7 +156,25 @@ class SubsquidQueryEngine(QueryAPI):
         if not block_is_available(self._gateway, network, query.stop_block):
             return None
 
-        return 400 + (query.stop_block - query.start_block) * 4
+        blocks = query.stop_block - query.start_block
+        # every topic filter roughly halves the amount of logs to transfer and decode
+        topics = len(get_log_request(query)) - 1
+        kind = get_query_kind(get_contract_event_query(query))
+        return self._estimate(network, kind, blocks, default=400 + blocks * 4 // 2**topics)
+
+    def _estimate(self, network: str, kind: str, blocks: int, default: int) -> int:
+        """
+        Estimate the query time from the measured gateway throughput,
+        ``default`` is used until there are enough measurements.
+        """
+        throughput = self._gateway.throughput
+        if throughput is None:
+            return default
+
+        # bounded queries are fetched by that many sub-ranges at once
+        concurrency = min(self._concurrency, math.ceil(max(blocks, 1) / PARALLEL_RANGE_SIZE))
+        estimate = throughput.estimate(network, kind, blocks, concurrency)
+        return default if estimate is None else estimate
 
     @singledispatchmethod
     def perform_query(self, query: QueryType) -> Iterator:  # type: ignore[override]
@@ -75,18 +185,19 @@ class SubsquidQueryEngine(QueryAPI):
     @perform_query.register
     def perform_block_query(self, query: BlockQuery) -> Iterator[BlockAPI]:
         network = get_network(self.network_manager)
-        q: Query = {
-            "fromBlock": query.start_block,
-            "toBlock": query.stop_block,
-            "fields": {"block": all_fields(BlockFieldSelection)},
-            "includeAllBlocks": True,
-            "transactions": [{}],
-        }
-
-        for data in gateway_ingest(self._gateway, network, q):
-            for block in data:
-                header_data = map_header(block["header"], block["transactions"])
-                yield self.provider.network.ecosystem.decode_block(header_data)
+        q = get_block_query(query)
+        return self._decode_blocks(self._ingest(network, q))
+
+    def _decode_blocks(self, chunks: Iterator[list[Block]]) -> Iterator[BlockAPI]:
+        ecosystem = self.provider.network.ecosystem
+        for data in chunks:
+            with self._instrumentation.measure("engine.map", query="block") as event:
+                headers = [map_header(block["header"], block["transactions"]) for block in data]
+                event.update(blocks=len(data), rows=len(headers))
+            with self._instrumentation.measure("engine.decode", query="block") as event:
+                blocks = [ecosystem.decode_block(header) for header in headers]
+                event.update(blocks=len(data), rows=len(blocks))
+            yield from blocks
 
     @perform_query.register
     def perform_account_transaction_query(
@@ -94,10 +205,10 @@ class SubsquidQueryEngine(QueryAPI):
     ) -> Iterator[ReceiptAPI]:
         network = get_network(self.network_manager)
         q: Query = {
-            "fromBlock": 0,
+            "fromBlock": self._get_nonce_start_block(network, query),
             "fields": {
                 "transaction": all_fields(TxFieldSelection),
-                "log": all_fields(LogFieldSelection),
+                "log": log_fields(),
             },
             "transactions": [
                 {
@@ -109,21 +220,21 @@ class SubsquidQueryEngine(QueryAPI):
             ],
         }
 
-        for data in gateway_ingest(self._gateway, network, q):
+        for data in self._ingest(network, q):
+            nonces = [
+                (tx["nonce"], block["header"]["number"])
+                for block in data
+                for tx in block["transactions"]
+            ]
+            self._nonce_index.put(network, query.account, nonces, self._gateway.get_height(network))
+
             for block in data:
+                receipts = BlockReceipts(block)
                 for tx in block["transactions"]:
                     assert tx["nonce"] >= query.start_nonce
                     assert tx["nonce"] <= query.stop_nonce
 
-                    block_number = block["header"]["number"]
-                    block_hash = HexBytes(block["header"]["hash"])
-                    logs = [
-                        map_log(log, block_number, block_hash)
-                        for log in block["logs"]
-                        if log["transactionIndex"] == tx["transactionIndex"]
-                    ]
-                    receipt_data = map_receipt(tx, block_number, block_hash, logs)
-
+                    receipt_data = receipts.get_receipt(tx)
                     yield self.provider.network.ecosystem.decode_receipt(receipt_data)
 
                     if tx["nonce"] == query.stop_nonce:
@@ -133,76 +244,511 @@ class SubsquidQueryEngine(QueryAPI):
     def perform_contract_creation_query(self, query: ContractCreationQuery) -> Iterator[ReceiptAPI]:
         network = get_network(self.network_manager)
         contract = query.contract.lower()
-        q: Query = {
-            "fromBlock": query.start_block,
-            "toBlock": query.stop_block,
-            "fields": {
-                "transaction": all_fields(TxFieldSelection),
-                "log": all_fields(LogFieldSelection),
-                "trace": {
-                    "transactionIndex": True,
-                    "createResultAddress": True,
-                },
-            },
-            "traces": [
-                {"createResultAddress": [contract], "transaction": True, "transactionLogs": True}
-            ],
-        }
+        ecosystem = self.provider.network.ecosystem
+        creation = self._creation_cache.get(network, contract)
+        # receipts fetched for some columns only aren't complete models
+        if creation is not None and creation_has_columns(creation, ["*"]):
+            if query.start_block <= creation["blockNumber"] <= query.stop_block:
+                yield ecosystem.decode_receipt(get_creation_receipt(creation))
+            return
+
+        fields = all_fields(TxFieldSelection)
+        creations = self._find_contract_creations(
+            network, [contract], query.start_block, query.stop_block, fields, True
+        )
+        for _, creation in creations:
+            yield ecosystem.decode_receipt(get_creation_receipt(creation))
 
-        for data in gateway_ingest(self._gateway, network, q):
-            for block in data:
-                for trace in block["traces"]:
-                    assert trace["result"]["address"] == contract
-
-                    block_number = block["header"]["number"]
-                    block_hash = HexBytes(block["header"]["hash"])
-                    tx = (
-                        tx
-                        for tx in block["transactions"]
-                        if tx["transactionIndex"] == trace["transactionIndex"]
-                    ).__next__()
-                    logs = [
-                        map_log(log, block_number, block_hash)
-                        for log in block["logs"]
-                        if log["transactionIndex"] == tx["transactionIndex"]
+    @perform_query.register
+    def perform_contract_event_query(self, query: ContractEventQuery) -> Iterator[ContractLog]:
+        network = get_network(self.network_manager)
+        q = get_contract_event_query(query)
+        return self._decode_events(query, self._ingest(network, q))
+
+    def _decode_events(
+        self, query: ContractEventQuery, chunks: Iterator[list[Block]], span_chunks: bool = True
+    ) -> Iterator[ContractLog]:
+        """
+        Decode the logs of the chunks in batches of ``_decode_batch_size``,
+        so the per call setup of the ecosystem decoder is paid once per batch
+        rather than per block. Unless ``span_chunks`` is off, batches span chunks
+        and they are decoded in parallel when ``_decode_processes`` are enabled.
+        """
+        ecosystem = self.provider.network.ecosystem
+        batch_size = self._decode_batch_size
+        if span_chunks:
+            batches = batch_logs(
+                self._map_chunks(chunks),
+                batch_size,
+                max_seconds=self._decode_batch_seconds,
+                max_blocks=self._decode_batch_blocks,
+            )
+            if self._decode_processes > 0:
+                yield from self._get_log_decoder().decode(ecosystem.name, batches, query.event)
+                return
+        else:
+            batches = (
+                batch for logs, _ in self._map_chunks(chunks) for batch in batched(logs, batch_size)
+            )
+
+        for batch in batches:
+            with self._instrumentation.measure("engine.decode", query="event") as event:
+                decoded = list(ecosystem.decode_logs(batch, query.event))
+                event.update(rows=len(decoded))
+            yield from decoded
+
+    def perform_event_queries(
+        self, queries: Sequence[ContractEventQuery]
+    ) -> Iterator[tuple[int, ContractLog]]:
+        """
+        Run several event queries scanning every block of their ranges once.
+
+        Overlapping ranges are split into segments, every segment is fetched with
+        a log request per query covering it, the received logs are matched back
+        to the queries and decoded with their events. Yields ``(query index, log)``
+        pairs in the order of logs, a log matching several queries is yielded
+        for each of them.
+        """
+        network = get_network(self.network_manager)
+        ecosystem = self.provider.network.ecosystem
+        segments = split_overlapping_ranges(
+            [(query.start_block, query.stop_block) for query in queries]
+        )
+
+        for start_block, stop_block, indexes in segments:
+            requests = [get_log_request(queries[index]) for index in indexes]
+            q: Query = {
+                "fromBlock": start_block,
+                "toBlock": stop_block,
+                "fields": {"log": log_fields()},
+                "logs": requests,
+            }
+            for data in self._ingest(network, q):
+                with self._instrumentation.measure("engine.map", query="events") as event:
+                    matched: list[list[LogRecord]] = [[] for _ in indexes]
+                    for block in data:
+                        for log, record in zip(block.get("logs", []), map_block_logs(block)):
+                            for position, request in enumerate(requests):
+                                if log_matches_request(log, request):
+                                    matched[position].append(record)
+                    event.update(blocks=len(data), rows=sum(map(len, matched)))
+
+                with self._instrumentation.measure("engine.decode", query="events") as event:
+                    decoded = [
+                        (index, log)
+                        for index, records in zip(indexes, matched)
+                        for log in ecosystem.decode_logs(records, queries[index].event)
                     ]
-                    receipt_data = map_receipt(tx, block_number, block_hash, logs)
+                    decoded.sort(key=lambda item: (item[1].block_number, item[1].log_index))
+                    event.update(blocks=len(data), rows=len(decoded))
+                yield from decoded
+
+    def _map_chunks(self, chunks: Iterable[list[Block]]) -> Iterator[tuple[list[LogRecord], int]]:
+        """
+        Map the logs of every chunk, yielded along with the last block of the chunk.
+        """
+        for data in chunks:
+            with self._instrumentation.measure("engine.map", query="event") as event:
+                logs = [log for block in data for log in map_block_logs(block)]
+                event.update(blocks=len(data), rows=len(logs))
+            yield logs, data[-1]["header"]["number"]
+
+    def _get_log_decoder(self) -> ParallelLogDecoder:
+        decoder = self._log_decoder
+        if decoder is None or decoder.processes != self._decode_processes:
+            if decoder is not None:
+                decoder.close()
+            decoder = ParallelLogDecoder(self._decode_processes, self._instrumentation)
+            self._log_decoder = decoder
+        return decoder
+
+    def close_log_decoder(self):
+        """
+        Shut down the processes decoding event logs, they are started again when needed.
+        """
+        if self._log_decoder is not None:
+            self._log_decoder.close()
+            self._log_decoder = None
 
-                    yield self.provider.network.ecosystem.decode_receipt(receipt_data)
-                    return
+    @singledispatchmethod
+    def perform_query_async(self, query: QueryType) -> AsyncIterator:
+        """
+        Asynchronously iterate over the query result without blocking the event loop
+        while waiting for the gateway.
+        """
+        raise QueryEngineError(
+            f"{self.__class__.__name__} cannot handle {query.__class__.__name__} queries "
+            "asynchronously."
+        )
 
-    @perform_query.register
-    def perform_contract_event_query(self, query: ContractEventQuery) -> Iterator[ContractLog]:
+    @perform_query_async.register
+    async def perform_block_query_async(self, query: BlockQuery) -> AsyncIterator[BlockAPI]:
+        network = get_network(self.network_manager)
+        q = get_block_query(query)
+        async for data in self._ingest_async(network, q):
+            # decoding holds the thread for a while, keep it off the loop
+            blocks = await asyncio.to_thread(list, self._decode_blocks(iter([data])))
+            for block in blocks:
+                yield block
+
+    @perform_query_async.register
+    async def perform_contract_event_query_async(
+        self, query: ContractEventQuery
+    ) -> AsyncIterator[ContractLog]:
+        network = get_network(self.network_manager)
+        q = get_contract_event_query(query)
+        async for data in self._ingest_async(network, q):
+            decoded = self._decode_events(query, iter([data]), span_chunks=False)
+            for log in await asyncio.to_thread(list, decoded):
+                yield log
+
+    def _ingest_async(self, network: str, query: Query) -> AsyncIterator[list[Block]]:
+        try:
+            # aiohttp is only installed with the `aio` extra
+            from ape_subsquid.aio import async_gateway, async_gateway_ingest
+        except ImportError as e:
+            raise QueryEngineError(
+                "Asynchronous queries require aiohttp, install `ape-subsquid[aio]`."
+            ) from e
+
+        return async_gateway_ingest(self._async_gateway or async_gateway, network, query)
+
+    @singledispatchmethod
+    def resume_query(self, query: QueryType) -> Iterator:
+        """
+        Iterate over the query result continuing after the last block completed
+        by an interrupted iteration of the same query.
+
+        The progress is checkpointed after every chunk once all its items are consumed,
+        so a restart repeats at most one chunk. The checkpoint is removed
+        when the query is complete.
+        """
+        raise QueryEngineError(
+            f"{self.__class__.__name__} cannot resume {query.__class__.__name__} queries."
+        )
+
+    @resume_query.register
+    def resume_block_query(self, query: BlockQuery) -> Iterator[BlockAPI]:
+        network = get_network(self.network_manager)
+        q = get_block_query(query)
+        return self._decode_blocks(self._ingest(network, q, checkpoints=self._checkpoints))
+
+    @resume_query.register
+    def resume_contract_event_query(self, query: ContractEventQuery) -> Iterator[ContractLog]:
         network = get_network(self.network_manager)
-        if isinstance(query.contract, list):
-            address = [address.lower() for address in query.contract]
+        q = get_contract_event_query(query)
+        chunks = self._ingest(network, q, checkpoints=self._checkpoints)
+        # a chunk is checkpointed once the next one is requested, so it must be decoded first
+        return self._decode_events(query, chunks, span_chunks=False)
+
+    @singledispatchmethod
+    def follow_query(self, query: QueryType, cursor: Optional[FollowCursor] = None) -> Iterator:
+        """
+        Iterate over the query result up to the archive height and keep yielding
+        new items as the height advances. The stop block of the query is ignored,
+        the iteration only ends when it is closed.
+
+        ``cursor`` is moved past every block as soon as all its items are yielded,
+        pass a cursor saved by a previous iteration to resume after it.
+        """
+        raise QueryEngineError(
+            f"{self.__class__.__name__} cannot follow {query.__class__.__name__} queries."
+        )
+
+    @follow_query.register
+    def follow_block_query(
+        self, query: BlockQuery, cursor: Optional[FollowCursor] = None
+    ) -> Iterator[BlockAPI]:
+        network = get_network(self.network_manager)
+        cursor = cursor or FollowCursor(query.start_block)
+        q = get_block_query(query)
+        q["fromBlock"] = cursor.next_block
+        ecosystem = self.provider.network.ecosystem
+        for data in self._follow(network, q):
+            blocks = [
+                ecosystem.decode_block(map_header(block["header"], block["transactions"]))
+                for block in data
+            ]
+            last_block = data[-1]["header"]["number"]
+            yield from iter_chunk(blocks, last_block, cursor, lambda block: block.number)
+
+    @follow_query.register
+    def follow_contract_event_query(
+        self, query: ContractEventQuery, cursor: Optional[FollowCursor] = None
+    ) -> Iterator[ContractLog]:
+        network = get_network(self.network_manager)
+        cursor = cursor or FollowCursor(query.start_block)
+        q = get_contract_event_query(query)
+        q["fromBlock"] = cursor.next_block
+        ecosystem = self.provider.network.ecosystem
+        for data in self._follow(network, q):
+            logs = [log for block in data for log in map_block_logs(block)]
+            decoded = list(ecosystem.decode_logs(logs, query.event))
+            last_block = data[-1]["header"]["number"]
+            yield from iter_chunk(decoded, last_block, cursor, lambda log: log.block_number)
+
+    @singledispatchmethod
+    def query_dataframe(self, query: QueryType) -> pd.DataFrame:
+        """
+        Get the query result as a DataFrame.
+
+        Block and event columns are filled in straight from the gateway responses
+        without building a model per row. Other columns fall back to the decoded models.
+        """
+        raise QueryEngineError(
+            f"{self.__class__.__name__} cannot handle {query.__class__.__name__} queries."
+        )
+
+    @query_dataframe.register
+    def query_block_dataframe(self, query: BlockQuery) -> pd.DataFrame:
+        block_class = get_block_class(self.provider.network.ecosystem)
+        columns = validate_and_expand_columns(query.columns, block_class)
+        if not supports_block_columns(columns):
+            return models_to_frame(self.perform_block_query(query), columns)
+
+        network = get_network(self.network_manager)
+        q = get_block_query(query, columns)
+        return blocks_to_frame(self._ingest(network, q), columns)
+
+    @query_dataframe.register
+    def query_contract_event_dataframe(self, query: ContractEventQuery) -> pd.DataFrame:
+        columns = validate_and_expand_columns(query.columns, ContractLog)
+        if not supports_event_columns(columns):
+            return models_to_frame(self.perform_contract_event_query(query), columns)
+
+        network = get_network(self.network_manager)
+        q = get_contract_event_query(query)
+        ecosystem = self.provider.network.ecosystem
+        return logs_to_frame(self._ingest(network, q), query.event, columns, ecosystem)
+
+    def resolve_contract_creations(
+        self,
+        addresses: Sequence[str],
+        start_block: int = 0,
+        stop_block: Optional[int] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Iterator[tuple[str, ReceiptAPI]]:
+        """
+        Find the creation receipts of many contracts at once.
+
+        Stored creations are yielded first, the rest of the addresses are looked up
+        in batches of ``_creation_batch_size`` with one trace scan per batch.
+        Receipts are yielded as soon as they are found and a scan stops
+        once all the addresses of its batch are resolved.
+        Addresses without a creation in the range are skipped.
+
+        Only the fields backing ``columns`` are fetched when they are given,
+        the other receipt fields are left empty.
+        """
+        network = get_network(self.network_manager)
+        ecosystem = self.provider.network.ecosystem
+        if stop_block is None:
+            stop_block = self._gateway.get_height(network)
+        if columns is None:
+            fields, with_logs = all_fields(TxFieldSelection), True
         else:
-            address = [query.contract.lower()]
+            fields, with_logs = receipt_fields(columns), receipt_needs_logs(columns)
+
+        originals = {address.lower(): address for address in addresses}
+        missing = []
+        for contract, address in originals.items():
+            creation = self._creation_cache.get(network, contract)
+            if creation is None or not creation_has_columns(creation, columns or ["*"]):
+                missing.append(contract)
+            elif start_block <= creation["blockNumber"] <= stop_block:
+                yield address, ecosystem.decode_receipt(get_creation_receipt(creation))
+
+        creations = self._find_contract_creations(
+            network, missing, start_block, stop_block, fields, with_logs
+        )
+        for contract, creation in creations:
+            yield originals[contract], ecosystem.decode_receipt(get_creation_receipt(creation))
+
+    def cache_contract_creations(
+        self, addresses: Sequence[str], start_block: int = 0, stop_block: Optional[int] = None
+    ) -> int:
+        """
+        Find and store the creations of many contracts for the following
+        contract creation queries. All the transaction fields and logs are fetched,
+        so the stored creations serve queries of any columns.
+
+        Returns the number of contracts found.
+        """
+        network = get_network(self.network_manager)
+        if stop_block is None:
+            stop_block = self._gateway.get_height(network)
 
-        q: Query = {
-            "fromBlock": query.start_block,
-            "toBlock": query.stop_block,
-            "fields": {"log": all_fields(LogFieldSelection)},
-            "logs": [{"address": address}],
-        }
+        addresses = [address.lower() for address in addresses]
+        fields = all_fields(TxFieldSelection)
+        creations = self._find_contract_creations(
+            network, addresses, start_block, stop_block, fields, True
+        )
+        return sum(1 for _ in creations)
+
+    def _find_contract_creations(
+        self,
+        network: str,
+        addresses: list[str],
+        start_block: int,
+        stop_block: int,
+        fields: TxFieldSelection,
+        with_logs: bool,
+    ) -> Iterator[tuple[str, ContractCreation]]:
+        for batch in batched(addresses, self._creation_batch_size):
+            unresolved = set(batch)
+            q = get_contract_creation_query(list(batch), start_block, stop_block, fields, with_logs)
+            for data in self._ingest(network, q):
+                creations = [
+                    (address, creation)
+                    for block in data
+                    for address, creation in get_block_creations(block, fields, with_logs)
+                    if address in unresolved
+                ]
+                self._creation_cache.put(network, creations, self._gateway.get_height(network))
+                for address, creation in creations:
+                    # a contract can only be created again after a self-destruct
+                    if address in unresolved:
+                        unresolved.remove(address)
+                        yield address, creation
+
+                if not unresolved:
+                    break
+
+    def _get_nonce_start_block(self, network: str, query: AccountTransactionQuery) -> int:
+        closest = self._nonce_index.get_closest(network, query.account, query.start_nonce)
+        if closest is not None and closest[0] == query.start_nonce:
+            return closest[1]
+
+        start_block = 0 if closest is None else closest[1]
+        return bisect_nonce_block(
+            lambda block: self._get_historical_nonce(network, query.account, block),
+            query.start_nonce,
+            start_block,
+            self._gateway.get_height(network),
+            resolution=self._nonce_bisection_resolution,
+            max_steps=self._nonce_bisection_steps,
+        )
 
-        for data in gateway_ingest(self._gateway, network, q):
-            for block in data:
-                block_number = block["header"]["number"]
-                block_hash = HexBytes(block["header"]["hash"])
-                logs = [map_log(log, block_number, block_hash) for log in block["logs"]]
+    def _get_historical_nonce(self, network: str, account: str, block: int) -> int:
+        try:
+            nonce = self.provider.get_nonce(account, block_id=block)
+        except Exception:
+            self._historical_state[network] = False
+            raise
+        self._historical_state[network] = True
+        return nonce
+
+    def _follow(self, network: str, query: Query) -> Iterator[list[Block]]:
+        return gateway_follow(
+            self._gateway,
+            network,
+            query,
+            self._polling_policy,
+            prefetch=self._prefetch,
+            concurrency=self._concurrency,
+        )
+
+    def _ingest(
+        self, network: str, query: Query, checkpoints: Optional[CheckpointStore] = None
+    ) -> Iterator[list[Block]]:
+        return gateway_ingest(
+            self._gateway,
+            network,
+            query,
+            prefetch=self._prefetch,
+            concurrency=self._concurrency,
+            checkpoints=checkpoints,
+        )
 
-                yield from self.provider.network.ecosystem.decode_logs(logs, query.event)
 
+# blocks per sub-range of a bounded query fetched in parallel
+PARALLEL_RANGE_SIZE = 10_000
+
+
+def get_block_query(query: BlockQuery, columns: Optional[Sequence[str]] = None) -> Query:
+    """
+    Pass ``columns`` to select only the fields backing them. The blocks are then
+    incomplete, so it's only done when no models are built from them.
+    """
+    fields = all_fields(BlockFieldSelection) if columns is None else block_fields(columns)
+    return {
+        "fromBlock": query.start_block,
+        "toBlock": query.stop_block,
+        "fields": {"block": fields},
+        "includeAllBlocks": True,
+        "transactions": [{}],
+    }
+
+
+def get_contract_event_query(query: ContractEventQuery) -> Query:
+    return {
+        "fromBlock": query.start_block,
+        "toBlock": query.stop_block,
+        "fields": {"log": log_fields()},
+        "logs": [get_log_request(query)],
+    }
+
+
+def get_contract_creation_query(
+    addresses: list[str],
+    start_block: int,
+    stop_block: int,
+    fields: TxFieldSelection,
+    with_logs: bool,
+) -> Query:
+    return {
+        "fromBlock": start_block,
+        "toBlock": stop_block,
+        "fields": {
+            "transaction": fields,
+            "log": log_fields() if with_logs else {},
+            "trace": {
+                "transactionIndex": True,
+                "createResultAddress": True,
+            },
+        },
+        "traces": [
+            {
+                "createResultAddress": addresses,
+                "transaction": True,
+                "transactionLogs": with_logs,
+            }
+        ],
+    }
+
+
+def get_log_request(query: ContractEventQuery) -> LogRequest:
+    if isinstance(query.contract, list):
+        address = [address.lower() for address in query.contract]
+    else:
+        address = [query.contract.lower()]
 
-T = TypeVar("T")
+    request = {"address": address}
+    # topics of anonymous events don't start with the selector
+    if not query.event.anonymous:
+        log_filter = LogFilter.from_event(event=query.event, search_topics=query.search_topics)
+        for index, topic in enumerate(log_filter.topic_filter):
+            if topic is not None:
+                topics = topic if isinstance(topic, list) else [topic]
+                request[f"topic{index}"] = [topic.lower() for topic in topics]
 
+    return cast(LogRequest, request)
 
-def all_fields(cls: Type[T]) -> T:
-    fields = cls.__annotations__
-    for field in fields:
-        fields[field] = True
-    return cast(T, fields)
+
+def log_matches_request(log: Log, request: LogRequest) -> bool:
+    if "address" in request and log["address"].lower() not in request["address"]:
+        return False
+
+    topics = log["topics"]
+    for index, selected in enumerate(get_topic_filters(request)):
+        if selected is not None and (index >= len(topics) or topics[index].lower() not in selected):
+            return False
+    return True
+
+
+def models_to_frame(models: Iterator[Any], columns: list[str]) -> pd.DataFrame:
+    data = map(partial(extract_fields, columns=columns), models)
+    return pd.DataFrame(columns=columns, data=data)
 
 
 def block_is_available(gateway: SubsquidGateway, network: str, block_num: int) -> bool:
@@ -217,14 +763,116 @@ def block_is_available(gateway: SubsquidGateway, network: str, block_num: int) -
 
 
 def ensure_range_is_available(gateway: SubsquidGateway, network: str, query: Query):
+    if "toBlock" not in query:
+        return
+
     height = gateway.get_height(network)
+    if query["toBlock"] > height:
+        # the cached height might be outdated
+        height = gateway.get_height(network, refresh=True)
     if query["toBlock"] > height:
         range = (query["fromBlock"], query["toBlock"])
         raise DataRangeIsNotAvailable(range, height)
 
 
-def gateway_ingest(gateway: SubsquidGateway, network: str, query: Query) -> Iterator[list[Block]]:
+def gateway_ingest(
+    gateway: SubsquidGateway,
+    network: str,
+    query: Query,
+    prefetch: int = 0,
+    concurrency: int = 1,
+    checkpoints: Optional[CheckpointStore] = None,
+) -> Iterator[list[Block]]:
+    """
+    Iterate over the query result chunk by chunk.
+
+    With a positive ``prefetch`` the chunks are downloaded in a background thread,
+    keeping at most ``prefetch`` of them ahead of the consumer.
+    Bounded queries with ``concurrency`` above one are split into sub-ranges
+    of ``PARALLEL_RANGE_SIZE`` blocks, ``concurrency`` of them are fetched at once
+    and the chunks are yielded back in block order.
+
+    With ``checkpoints`` the ingest continues after the last block completed
+    by a previous ingest of the same query. The last block of a chunk is recorded
+    once the consumer asks for the next one and the checkpoint is removed
+    when the query is complete.
+    """
+    if checkpoints is not None:
+        yield from _checkpointed_ingest(gateway, network, query, prefetch, concurrency, checkpoints)
+        return
+
     ensure_range_is_available(gateway, network, query)
+    if concurrency > 1 and "toBlock" in query:
+        chunks = _fan_out(gateway, network, query, concurrency, prefetch)
+    elif prefetch > 0:
+        chunks = iterate_in_background(_ingest(gateway, network, query), prefetch)
+    else:
+        chunks = _ingest(gateway, network, query)
+    yield from chunks
+
+
+def _checkpointed_ingest(
+    gateway: SubsquidGateway,
+    network: str,
+    query: Query,
+    prefetch: int,
+    concurrency: int,
+    checkpoints: CheckpointStore,
+) -> Iterator[list[Block]]:
+    resumed_query = query.copy()
+    last_block = checkpoints.get(network, query)
+    if last_block is not None:
+        if "toBlock" in query and last_block >= query["toBlock"]:
+            checkpoints.delete(network, query)
+            return
+
+        logger.info(f"Resuming the ingest after block {last_block}")
+        resumed_query["fromBlock"] = last_block + 1
+
+    chunks = gateway_ingest(gateway, network, resumed_query, prefetch, concurrency)
+    for data in chunks:
+        yield data
+        checkpoints.put(network, query, data[-1]["header"]["number"])
+    checkpoints.delete(network, query)
+
+
+def _fan_out(
+    gateway: SubsquidGateway, network: str, query: Query, concurrency: int, prefetch: int
+) -> Iterator[list[Block]]:
+    """
+    Fetch sub-ranges of ``PARALLEL_RANGE_SIZE`` blocks through a sliding window.
+
+    ``concurrency`` sub-ranges are fetched at once, each keeping at most ``prefetch``
+    chunks (at least one) ahead of the consumer, which reads the oldest one
+    while it is still arriving. The next sub-range starts once the oldest one is read.
+    """
+    total = query["toBlock"] - query["fromBlock"] + 1
+    parts_count = -(-total // PARALLEL_RANGE_SIZE)
+    ranges = iter(split_range(query["fromBlock"], query["toBlock"], parts_count))
+    window: deque[BackgroundIterator[list[Block]]] = deque()
+
+    def start_next():
+        for from_block, to_block in ranges:
+            sub_query = query.copy()
+            sub_query["fromBlock"] = from_block
+            sub_query["toBlock"] = to_block
+            chunks = _ingest(gateway, network, sub_query)
+            window.append(iterate_in_background(chunks, max(prefetch, 1)))
+            return
+
+    try:
+        for _ in range(concurrency):
+            start_next()
+        while window:
+            yield from window[0]
+            window.popleft()
+            start_next()
+    finally:
+        for part in window:
+            part.close()
+
+
+def _ingest(gateway: SubsquidGateway, network: str, query: Query) -> Iterator[list[Block]]:
     while True:
         data = gateway.query(network, query)
         yield data
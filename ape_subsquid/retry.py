@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from random import uniform
+from threading import Lock
+from time import monotonic
+from typing import Mapping, Optional
+
+
+@dataclass
+class RetryPolicy:
+    """
+    When and how long to wait before repeating a failed gateway request.
+    """
+
+    max_retries: int = 5
+
+    base_delay: float = 5.0
+    """Pause before the first retry, it doubles with every next one."""
+
+    max_delay: float = 60.0
+
+    retry_statuses: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+
+    def should_retry(self, status: Optional[int]) -> bool:
+        """
+        Check if a request failed with ``status`` should be retried,
+        ``None`` stands for connection errors and timeouts which are always retried.
+        """
+        return status is None or status in self.retry_statuses
+
+    def get_pause(self, retries: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        pause = min(self.base_delay * 2**retries, self.max_delay)
+        # jitter desynchronizes parallel requests rejected at the same time
+        return round(pause * uniform(1, 1.5), 1)
+
+
+def get_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Get seconds to wait from the ``Retry-After`` header holding either seconds or a date.
+    """
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class CircuitBreaker:
+    """
+    Keeps requests away from the workers which keep failing.
+
+    A worker is avoided for ``reset_timeout`` seconds after ``failure_threshold``
+    consecutive failures. Then a single trial request is let through,
+    its success closes the circuit and a failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # worker -> consecutive failures
+        self._failures: dict[str, int] = {}
+        # worker -> time the circuit was opened at
+        self._opened: dict[str, float] = {}
+        self._lock = Lock()
+
+    def is_open(self, worker: str) -> bool:
+        with self._lock:
+            opened = self._opened.get(worker)
+            if opened is None:
+                return False
+            if monotonic() - opened < self.reset_timeout:
+                return True
+
+            # let a trial request through and reopen right away if it fails
+            del self._opened[worker]
+            self._failures[worker] = self.failure_threshold - 1
+            return False
+
+    def get_reset_in(self, worker: str) -> float:
+        """
+        Get seconds left until a trial request is let through to ``worker``,
+        zero if its circuit isn't open.
+        """
+        with self._lock:
+            opened = self._opened.get(worker)
+            if opened is None:
+                return 0.0
+            return max(self.reset_timeout - (monotonic() - opened), 0.0)
+
+    def record_success(self, worker: str):
+        with self._lock:
+            self._failures.pop(worker, None)
+            self._opened.pop(worker, None)
+
+    def record_failure(self, worker: str):
+        with self._lock:
+            failures = self._failures.get(worker, 0) + 1
+            self._failures[worker] = failures
+            if failures >= self.failure_threshold:
+                self._opened[worker] = monotonic()
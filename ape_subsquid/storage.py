@@ -0,0 +1,52 @@
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import Iterator, Optional
+
+from ape_subsquid.utils import get_data_folder
+
+
+class SqliteStore:
+    """
+    Base of the local indexes kept in a sqlite database.
+
+    The database is created under the plugin data folder on the first access.
+    One connection is shared between threads and guarded by a lock.
+    """
+
+    _file_name: str
+    _schema: str
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = Lock()
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            self._path = get_data_folder() / self._file_name
+        return self._path
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                yield connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self._schema)
+            self._connection = connection
+        return self._connection
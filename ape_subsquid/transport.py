@@ -0,0 +1,141 @@
+import zlib
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Iterator, Optional, Protocol
+
+from requests import Response, Session
+from urllib3.util.request import ACCEPT_ENCODING
+
+try:
+    import brotlicffi as brotli
+except ImportError:
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# encodings in the order of preference, zstd and br are there if their packages are installed
+PREFERRED_ENCODINGS = ("zstd", "br", "gzip", "deflate")
+
+
+class ContentDecoder(Protocol):
+    def decompress(self, data: bytes) -> bytes:
+        ...
+
+    def flush(self) -> bytes:
+        ...
+
+
+class BrotliDecoder:
+    def __init__(self) -> None:
+        decoder = brotli.Decompressor()
+        # Brotli names the method ``process``, brotlicffi ``decompress``
+        self.decompress: Callable[[bytes], bytes] = (
+            getattr(decoder, "process", None) or decoder.decompress
+        )
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def get_accept_encoding() -> str:
+    # requests bodies are decoded by urllib3, so only the encodings it supports are accepted
+    supported = ACCEPT_ENCODING.split(",")
+    return ", ".join(
+        encoding
+        for encoding in PREFERRED_ENCODINGS
+        if encoding in supported and encoding in DECODERS
+    )
+
+
+def get_decoder(encoding: Optional[str]) -> Optional[ContentDecoder]:
+    """
+    Get a decoder for a body sent with the ``Content-Encoding``, ``None`` if it isn't encoded.
+    """
+    if not encoding or encoding == "identity":
+        return None
+    try:
+        return DECODERS[encoding.strip().lower()]()
+    except KeyError:
+        raise ValueError(f"Unsupported content encoding: {encoding}") from None
+
+
+def _get_gzip_decoder() -> ContentDecoder:
+    # the offset makes zlib expect a gzip header
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def _get_deflate_decoder() -> ContentDecoder:
+    return zlib.decompressobj()
+
+
+# decoders of the encodings from ``get_accept_encoding``
+DECODERS: dict[str, Callable[[], ContentDecoder]] = {
+    "gzip": _get_gzip_decoder,
+    "deflate": _get_deflate_decoder,
+}
+if brotli is not None:
+    DECODERS["br"] = BrotliDecoder
+if zstandard is not None:
+    DECODERS["zstd"] = lambda: zstandard.ZstdDecompressor().decompressobj()
+
+
+def create_session() -> Session:
+    session = Session()
+    session.headers["Accept-Encoding"] = get_accept_encoding()
+    return session
+
+
+@dataclass
+class TransferStats:
+    """
+    Amount of data transferred for one or many responses.
+    """
+
+    size: int = 0
+    """Size of the decompressed body."""
+
+    wire_size: int = 0
+    """Size of the body as it was received."""
+
+    encoding: Optional[str] = None
+
+    seconds: float = 0.0
+    """Time from sending the request until the body was read."""
+
+    @property
+    def compression_ratio(self) -> float:
+        return self.size / self.wire_size if self.wire_size else 1.0
+
+
+class TransferCounter:
+    """
+    Thread-safe running total of the transferred data.
+    """
+
+    def __init__(self) -> None:
+        self.total = TransferStats()
+        self._lock = Lock()
+
+    def add(self, stats: TransferStats):
+        with self._lock:
+            self.total.size += stats.size
+            self.total.wire_size += stats.wire_size
+            self.total.seconds += stats.seconds
+
+
+def iter_body(response: Response, chunk_size: int, stats: TransferStats) -> Iterator[bytes]:
+    """
+    Iterate over the decompressed body while counting both its decompressed
+    and received size.
+    """
+    stats.encoding = response.headers.get("Content-Encoding")
+    for chunk in response.iter_content(chunk_size):
+        stats.size += len(chunk)
+        yield chunk
+    stats.wire_size = response.raw.tell()
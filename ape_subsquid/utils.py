@@ -1,21 +1,71 @@
 import functools
+import threading
 import time
+from collections import OrderedDict
+from itertools import islice
+from pathlib import Path
+from queue import Empty, Full, Queue
+from typing import Iterable, Iterator, Sequence, TypeVar
 
+T = TypeVar("T")
+
+
+def ttl_cache(
+    seconds: int, maxsize: int = 128, stale_seconds: int = 0, ignore: tuple[str, ...] = ()
+):
+    """
+    Cache results per call arguments for ``seconds``.
+
+    Expired results younger than ``seconds + stale_seconds`` are still returned
+    while they are refreshed in a background thread.
+    Keyword arguments listed in ``ignore`` aren't a part of the cache key
+    and ``refresh=True`` bypasses the cached value.
+    """
 
-def ttl_cache(seconds: int):
     def decorator(func):
-        value = None
-        last_access = 0
+        values: OrderedDict = OrderedDict()
+        refreshing = set()
+        lock = threading.Lock()
 
-        @functools.wraps(func)
-        def inner(*args, **kwargs):
-            nonlocal value, last_access
-            now = time.time()
+        def store(key, value):
+            with lock:
+                values[key] = (value, time.monotonic())
+                values.move_to_end(key)
+                while len(values) > maxsize:
+                    values.popitem(last=False)
 
-            if (now - seconds) >= last_access or value is None:
-                value = func(*args, **kwargs)
-                last_access = time.time()
+        def revalidate(key, args, kwargs):
+            try:
+                store(key, func(*args, **kwargs))
+            except Exception:
+                # the stale value is kept until the next attempt
+                pass
+            finally:
+                with lock:
+                    refreshing.discard(key)
 
+        @functools.wraps(func)
+        def inner(*args, refresh: bool = False, **kwargs):
+            key = (args, tuple(sorted(item for item in kwargs.items() if item[0] not in ignore)))
+            if not refresh:
+                with lock:
+                    entry = values.get(key)
+                    if entry is not None:
+                        value, timestamp = entry
+                        age = time.monotonic() - timestamp
+                        if age < seconds:
+                            values.move_to_end(key)
+                            return value
+                        elif age < seconds + stale_seconds:
+                            if key not in refreshing:
+                                refreshing.add(key)
+                                threading.Thread(
+                                    target=revalidate, args=(key, args, kwargs), daemon=True
+                                ).start()
+                            return value
+
+            value = func(*args, **kwargs)
+            store(key, value)
             return value
 
         return inner
@@ -25,3 +75,151 @@ def ttl_cache(seconds: int):
 
 def hex_to_int(value: str):
     return int(value, 16)
+
+
+def get_data_folder() -> Path:
+    # fix circular import
+    from ape import config
+
+    return config.DATA_FOLDER / "subsquid"
+
+
+class _Done:
+    pass
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+class BackgroundIterator(Iterator[T]):
+    """
+    Drives an iterator from a background thread while the caller consumes its items.
+
+    At most ``buffer_size`` items are kept in memory ahead of the consumer,
+    the producer is paused until the consumer catches up.
+    Errors raised by the iterator are re-raised to the consumer.
+    """
+
+    def __init__(self, iterator: Iterator[T], buffer_size: int) -> None:
+        self._buffer: Queue = Queue(maxsize=buffer_size)
+        self._stopped = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._produce, args=(iterator,), daemon=True)
+        self._thread.start()
+
+    def __next__(self) -> T:
+        if self._finished:
+            raise StopIteration
+
+        while True:
+            try:
+                item = self._buffer.get(timeout=0.1)
+            except Empty:
+                if self._thread.is_alive():
+                    continue
+                try:
+                    item = self._buffer.get_nowait()
+                except Empty:
+                    item = _Done()
+
+            if isinstance(item, _Done):
+                self.close()
+                raise StopIteration
+            elif isinstance(item, _Failure):
+                self.close()
+                raise item.error
+            else:
+                return item
+
+    def close(self):
+        self._finished = True
+        self._stopped.set()
+
+    def _put(self, item) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._buffer.put(item, timeout=0.1)
+            except Full:
+                continue
+            else:
+                return True
+        return False
+
+    def _produce(self, iterator: Iterator[T]):
+        try:
+            # checked before every item, so a closed iterator sends no more requests
+            while not self._stopped.is_set():
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self._put(_Done())
+                    return
+                if not self._put(item):
+                    return
+        except BaseException as e:
+            self._put(_Failure(e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+
+def iterate_in_background(iterator: Iterator[T], buffer_size: int) -> BackgroundIterator[T]:
+    """
+    Start consuming ``iterator`` in a background thread right away.
+    """
+    return BackgroundIterator(iterator, buffer_size)
+
+
+def split_range(start: int, stop: int, parts: int, min_size: int = 1) -> list[tuple[int, int]]:
+    """
+    Split an inclusive ``[start, stop]`` range into at most ``parts`` contiguous sub-ranges
+    each spanning at least ``min_size`` blocks.
+    """
+    total = stop - start + 1
+    parts = max(1, min(parts, total // max(min_size, 1)))
+    size, remainder = divmod(total, parts)
+    ranges = []
+    for i in range(parts):
+        stop = start + size + (1 if i < remainder else 0) - 1
+        ranges.append((start, stop))
+        start = stop + 1
+    return ranges
+
+
+def split_overlapping_ranges(ranges: Sequence[tuple[int, int]]) -> list[tuple[int, int, list[int]]]:
+    """
+    Split the union of inclusive ranges into consecutive segments, each given
+    with the indexes of the ranges covering it, so every block is in one segment.
+    Neighbouring segments covered by the same ranges are joined.
+    """
+    bounds = sorted({start for start, _ in ranges} | {stop + 1 for _, stop in ranges})
+    segments: list[tuple[int, int, list[int]]] = []
+    for start, end in zip(bounds, bounds[1:]):
+        covering = [
+            index
+            for index, (first, last) in enumerate(ranges)
+            if first <= start and end <= last + 1
+        ]
+        if not covering:
+            continue
+        if segments and segments[-1][1] == start - 1 and segments[-1][2] == covering:
+            segments[-1] = (segments[-1][0], end - 1, covering)
+        else:
+            segments.append((start, end - 1, covering))
+    return segments
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """
+    Split ``items`` into lists of ``size`` items, the last one can be shorter.
+    Items are consumed lazily, so batches can span chunks of a running ingest.
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
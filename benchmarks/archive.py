@@ -0,0 +1,300 @@
+"""
+Local stand-in for the Subsquid archive serving synthetic blocks.
+
+It implements the endpoints used by the gateway:
+
+- ``GET /network/{network}/height``
+- ``GET /network/{network}/{block}/worker``
+- ``POST /worker``
+
+Blocks are generated deterministically from their numbers. Every block has
+``transactions`` transactions, the first one is sent by ``ACCOUNT`` with the nonce
+equal to the block number, ``logs`` ERC-20 transfers emitted by ``TOKEN``
+and ``traces`` contract creations. Data responses are compressed with ``compression``
+if the client accepts it.
+"""
+import gzip
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+ACCOUNT = "0x" + "a1" * 20
+TOKEN = "0x" + "70" * 20
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+@dataclass
+class ArchiveConfig:
+    height: int = 1_000_000
+    transactions: int = 10
+    logs: int = 20
+    traces: int = 1
+    # max number of blocks scanned per request, responses are also limited by ``max_size``
+    max_blocks: int = 1000
+    max_size: int = 4 * 1024**2
+    # seconds added before every response
+    latency: float = 0.0
+    # share of data requests rejected with 503
+    error_rate: float = 0.0
+    # bytes per second, 0 is unlimited
+    bandwidth: int = 0
+    # gzip or zstd, data is compressed if the client accepts it
+    compression: Optional[str] = None
+    seed: int = 0
+
+
+def created_address(block: int, index: int) -> str:
+    return "0x%032x%08x" % (block, index)
+
+
+def get_header(number: int) -> dict[str, Any]:
+    return {
+        "number": number,
+        "hash": "0x%064x" % (number + 1),
+        "parentHash": "0x%064x" % number,
+        "timestamp": 1_600_000_000 + number * 12,
+        "miner": "0x" + "00" * 20,
+        "size": 1000,
+        "gasLimit": hex(30_000_000),
+        "gasUsed": hex(15_000_000),
+        "baseFeePerGas": hex(10**9),
+        "difficulty": "0x0",
+        "totalDifficulty": "0x0",
+        "extraData": "0x",
+        "nonce": "0x0000000000000000",
+        "mixHash": "0x" + "00" * 32,
+        "sha3Uncles": "0x" + "00" * 32,
+        "stateRoot": "0x" + "00" * 32,
+        "transactionsRoot": "0x" + "00" * 32,
+        "receiptsRoot": "0x" + "00" * 32,
+        "logsBloom": "0x" + "00" * 256,
+    }
+
+
+def get_transaction(number: int, index: int) -> dict[str, Any]:
+    sender = ACCOUNT if index == 0 else "0x%040x" % (index + 1)
+    return {
+        "transactionIndex": index,
+        "hash": "0x%056x%08x" % (number, index),
+        "nonce": number,
+        "from": sender,
+        "to": TOKEN,
+        "input": "0x",
+        "value": "0x0",
+        "gas": hex(100_000),
+        "gasPrice": hex(2 * 10**9),
+        "maxFeePerGas": hex(3 * 10**9),
+        "maxPriorityFeePerGas": hex(10**9),
+        "v": "0x1",
+        "r": "0x" + "11" * 32,
+        "s": "0x" + "22" * 32,
+        "yParity": 1,
+        "chainId": 1,
+        "gasUsed": hex(50_000),
+        "cumulativeGasUsed": hex(50_000 * (index + 1)),
+        "effectiveGasPrice": hex(2 * 10**9),
+        "contractAddress": None,
+        "type": 2,
+        "status": 1,
+    }
+
+
+def get_log(number: int, index: int, transactions: int) -> dict[str, Any]:
+    transaction_index = index % max(transactions, 1)
+    return {
+        "logIndex": index,
+        "transactionIndex": transaction_index,
+        "transactionHash": "0x%056x%08x" % (number, transaction_index),
+        "address": TOKEN,
+        "data": "0x%064x" % (index + 1),
+        "topics": [
+            TRANSFER_TOPIC,
+            "0x%064x" % (number + 1),
+            "0x%064x" % (index + 1),
+        ],
+    }
+
+
+def get_trace(number: int, index: int, transactions: int) -> dict[str, Any]:
+    return {
+        "transactionIndex": index % max(transactions, 1),
+        "type": "create",
+        "result": {"address": created_address(number, index)},
+    }
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body)
+    elif encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor().compress(body)
+    raise ValueError(f"Unsupported encoding {encoding}")
+
+
+class FakeArchive:
+    def __init__(self, config: Optional[ArchiveConfig] = None) -> None:
+        self.config = config or ArchiveConfig()
+        self.requests = 0
+        # bytes of the data responses as they were sent
+        self.sent = 0
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self) -> "FakeArchive":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def query(self, query: dict[str, Any]) -> list[dict[str, Any]]:
+        config = self.config
+        from_block = query["fromBlock"]
+        to_block = min(query.get("toBlock", config.height), config.height)
+        to_block = min(to_block, from_block + config.max_blocks - 1)
+        include_all = query.get("includeAllBlocks", False)
+
+        blocks = []
+        size = 0
+        for number in range(from_block, to_block + 1):
+            block = self._get_block(number, query)
+            matched = any(block.get(key) for key in ("transactions", "logs", "traces"))
+            if include_all or matched or number == to_block:
+                blocks.append(block)
+                size += len(json.dumps(block))
+                if size > config.max_size:
+                    break
+        return blocks
+
+    def _get_block(self, number: int, query: dict[str, Any]) -> dict[str, Any]:
+        config = self.config
+        block: dict[str, Any] = {"header": get_header(number)}
+        transactions: set[int] = set()
+        logs = []
+        for request in query.get("logs", []):
+            if TOKEN in request.get("address", [TOKEN]) and TRANSFER_TOPIC in request.get(
+                "topic0", [TRANSFER_TOPIC]
+            ):
+                logs = [get_log(number, index, config.transactions) for index in range(config.logs)]
+                if request.get("transaction"):
+                    transactions.update(log["transactionIndex"] for log in logs)
+
+        traces = []
+        for request in query.get("traces", []):
+            addresses = set(request.get("createResultAddress", []))
+            for index in range(config.traces):
+                trace = get_trace(number, index, config.transactions)
+                if not addresses or trace["result"]["address"] in addresses:
+                    traces.append(trace)
+                    if request.get("transaction"):
+                        transactions.add(trace["transactionIndex"])
+                    if request.get("transactionLogs"):
+                        logs.extend(
+                            log
+                            for log in (
+                                get_log(number, i, config.transactions) for i in range(config.logs)
+                            )
+                            if log["transactionIndex"] == trace["transactionIndex"]
+                        )
+
+        for request in query.get("transactions", []):
+            for index in range(config.transactions):
+                tx = get_transaction(number, index)
+                if "from" in request and tx["from"] not in request["from"]:
+                    continue
+                if (
+                    not request.get("firstNonce", 0)
+                    <= tx["nonce"]
+                    <= request.get("lastNonce", tx["nonce"])
+                ):
+                    continue
+                transactions.add(index)
+                if request.get("logs"):
+                    logs.extend(
+                        get_log(number, i, config.transactions)
+                        for i in range(config.logs)
+                        if i % max(config.transactions, 1) == index
+                    )
+
+        # requested kinds of items are present even if nothing matched
+        if transactions or "transactions" in query:
+            block["transactions"] = [
+                get_transaction(number, index) for index in sorted(transactions)
+            ]
+        if logs or "logs" in query:
+            block["logs"] = logs
+        if traces or "traces" in query:
+            block["traces"] = traces
+        return block
+
+    def _handler(self):
+        archive = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if parts[-1] == "height":
+                    self._send(200, str(archive.config.height).encode())
+                elif parts[-1] == "worker":
+                    self._send(200, f"{archive.url}/worker".encode())
+                else:
+                    self._send(404, b"Not found")
+
+            def do_POST(self):
+                query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with archive._lock:
+                    archive.requests += 1
+                    failed = archive._random.random() < archive.config.error_rate
+                if archive.config.latency:
+                    time.sleep(archive.config.latency)
+                if failed:
+                    self._send(503, b"Service is overloaded")
+                    return
+
+                body = json.dumps(archive.query(query)).encode()
+                encoding = archive.config.compression
+                if encoding and encoding in self.headers.get("Accept-Encoding", ""):
+                    body = compress(body, encoding)
+                else:
+                    encoding = None
+                with archive._lock:
+                    archive.sent += len(body)
+                self._send(200, body, encoding)
+
+            def _send(self, status: int, body: bytes, encoding: Optional[str] = None):
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+                self.end_headers()
+                bandwidth = archive.config.bandwidth
+                if not bandwidth:
+                    self.wfile.write(body)
+                    return
+
+                piece = max(bandwidth // 10, 1)
+                for start in range(0, len(body), piece):
+                    stop = start + piece
+                    self.wfile.write(body[start:stop])
+                    time.sleep(piece / bandwidth)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
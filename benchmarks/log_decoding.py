@@ -0,0 +1,66 @@
+"""
+Compares decoding event logs with one ``decode_logs`` call per block
+against one call per batch of logs spanning many blocks.
+
+Usage: python benchmarks/log_decoding.py [blocks] [logs per block] [batch size]
+"""
+import sys
+from timeit import timeit
+from typing import cast
+
+from ape import networks
+from archive import get_header, get_log
+from ethpm_types.abi import EventABI
+from run import TRANSFER_ABI
+
+from ape_subsquid.gateway import Block
+from ape_subsquid.mappings import LogRecord, map_block_logs
+from ape_subsquid.utils import batched
+
+
+def make_logs(blocks: int, logs_per_block: int) -> list[list[LogRecord]]:
+    data = [
+        {
+            "header": get_header(number),
+            "logs": [get_log(number, index, 10) for index in range(logs_per_block)],
+        }
+        for number in range(blocks)
+    ]
+    return [map_block_logs(cast(Block, block)) for block in data]
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    logs_per_block = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    ecosystem = networks.get_ecosystem("ethereum")
+    event = EventABI.model_validate(TRANSFER_ABI)
+
+    logs = make_logs(blocks, logs_per_block)
+    rows = blocks * logs_per_block
+
+    def per_block():
+        return [log for block_logs in logs for log in ecosystem.decode_logs(block_logs, event)]
+
+    def per_batch():
+        records = (log for block_logs in logs for log in block_logs)
+        return [
+            log
+            for batch in batched(records, batch_size)
+            for log in ecosystem.decode_logs(batch, event)
+        ]
+
+    assert per_block() == per_batch()
+
+    number = 3
+    block_time = timeit(per_block, number=number) / number
+    batch_time = timeit(per_batch, number=number) / number
+    sys.stdout.write(f"{blocks} blocks, {rows} logs, batches of {batch_size}\n")
+    sys.stdout.write(f"per block: {block_time / rows * 1e6:.1f} us per log\n")
+    sys.stdout.write(
+        f"per batch: {batch_time / rows * 1e6:.1f} us per log ({block_time / batch_time:.2f}x)\n"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares decoding event logs in the querying process against a pool of processes
+and breaks the pool overhead down into the start up and the pickling of logs and results.
+
+Usage: python benchmarks/parallel_decoding.py [logs] [batch size] [processes ...]
+"""
+import os
+import pickle
+import sys
+import time
+from timeit import timeit
+
+from ape import networks
+from ethpm_types.abi import EventABI
+from log_decoding import make_logs
+from run import TRANSFER_ABI
+
+from ape_subsquid.decoding import ParallelLogDecoder
+from ape_subsquid.utils import batched
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    cpus = os.cpu_count() or 1
+    counts = [int(arg) for arg in sys.argv[3:]] or sorted({1, 2, cpus})
+    ecosystem = networks.get_ecosystem("ethereum")
+    event = EventABI.model_validate(TRANSFER_ABI)
+    logs = [log for block_logs in make_logs(rows // 20, 20) for log in block_logs]
+
+    started = time.perf_counter()
+    decoded = list(ecosystem.decode_logs(logs, event))
+    serial = time.perf_counter() - started
+    sys.stdout.write(f"{len(logs)} logs, batches of {batch_size}, {cpus} CPUs\n")
+    sys.stdout.write(f"serial:      {serial:6.2f}s {serial / len(logs) * 1e6:7.1f} us per log\n")
+
+    pickling = timeit(lambda: pickle.loads(pickle.dumps((logs, decoded))), number=1)
+    sys.stdout.write(
+        f"pickling:    {pickling:6.2f}s {pickling / len(logs) * 1e6:7.1f} us per log\n"
+    )
+
+    for processes in counts:
+        decoder = ParallelLogDecoder(processes)
+        started = time.perf_counter()
+        # the first batch includes starting the processes and loading the plugins
+        list(decoder.decode("ethereum", [logs[:1]] * processes, event))
+        start_up = time.perf_counter() - started
+
+        started = time.perf_counter()
+        parallel = list(decoder.decode("ethereum", batched(logs, batch_size), event))
+        seconds = time.perf_counter() - started
+        decoder.close()
+        assert parallel == decoded
+        sys.stdout.write(
+            f"{processes:2} processes: {seconds:6.2f}s {seconds / len(logs) * 1e6:7.1f} us per log "
+            f"({serial / seconds:.2f}x), {start_up:.2f}s start up\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compares assembling receipts of large blocks by scanning all the block logs
+per transaction against grouping them with ``BlockReceipts``.
+
+Usage: python benchmarks/receipt_assembly.py [transactions] [logs per transaction]
+"""
+import sys
+from timeit import timeit
+from typing import cast
+
+from hexbytes import HexBytes
+
+from ape_subsquid.gateway import Block
+from ape_subsquid.mappings import BlockReceipts, ReceiptRecord, map_log, map_receipt
+
+
+def make_block(transactions: int, logs_per_transaction: int) -> Block:
+    data = {
+        "header": {"number": 18_000_000, "hash": "0x" + "ab" * 32},
+        "transactions": [
+            {
+                "transactionIndex": index,
+                "hash": "0x%064x" % index,
+                "nonce": index,
+                "from": "0x" + "11" * 20,
+                "to": "0x" + "22" * 20,
+                "gas": "0x5208",
+                "gasUsed": "0x5208",
+                "value": "0x0",
+                "status": 1,
+                "type": 2,
+            }
+            for index in range(transactions)
+        ],
+        "logs": [
+            {
+                "address": "0x" + "33" * 20,
+                "transactionIndex": index,
+                "transactionHash": "0x%064x" % index,
+                "logIndex": index * logs_per_transaction + position,
+                "data": "0x",
+                "topics": ["0x" + "44" * 32],
+            }
+            for index in range(transactions)
+            for position in range(logs_per_transaction)
+        ],
+    }
+    return cast(Block, data)
+
+
+def scan_logs(block: Block) -> list[ReceiptRecord]:
+    receipts = []
+    for tx in block["transactions"]:
+        block_number = block["header"]["number"]
+        block_hash = HexBytes(block["header"]["hash"])
+        logs = [
+            map_log(log, block_number, block_hash)
+            for log in block.get("logs", [])
+            if log["transactionIndex"] == tx["transactionIndex"]
+        ]
+        receipts.append(map_receipt(tx, block_number, block_hash, logs))
+    return receipts
+
+
+def group_logs(block: Block) -> list[ReceiptRecord]:
+    receipts = BlockReceipts(block)
+    return [receipts.get_receipt(tx) for tx in block["transactions"]]
+
+
+def main():
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    logs_per_transaction = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    block = make_block(transactions, logs_per_transaction)
+    assert scan_logs(block) == group_logs(block)
+
+    number = 5
+    scan = timeit(lambda: scan_logs(block), number=number) / number
+    group = timeit(lambda: group_logs(block), number=number) / number
+    print(f"{transactions} transactions, {transactions * logs_per_transaction} logs")  # noqa: T201
+    print(f"scan:  {scan * 1000:.1f} ms per block")  # noqa: T201
+    print(f"group: {group * 1000:.1f} ms per block ({scan / group:.1f}x)")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
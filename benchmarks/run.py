@@ -0,0 +1,218 @@
+"""
+Benchmarks of the query engine against a local fake archive.
+
+Every benchmark runs in its own process, so the reported peak RSS is its own.
+
+Usage: python benchmarks/run.py [--blocks 20000] [--logs 20] [--latency 0.05] [ingest events ...]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+BENCHMARKS = ("ingest", "blocks", "events", "account", "creation", "creations")
+
+TRANSFER_ABI = {
+    "type": "event",
+    "name": "Transfer",
+    "anonymous": False,
+    "inputs": [
+        {"name": "from", "type": "address", "indexed": True},
+        {"name": "to", "type": "address", "indexed": True},
+        {"name": "value", "type": "uint256", "indexed": False},
+    ],
+}
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("benchmarks", nargs="*", help=f"any of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--blocks", type=int, default=20_000, help="size of the queried range")
+    parser.add_argument("--transactions", type=int, default=10, help="transactions per block")
+    parser.add_argument("--logs", type=int, default=20, help="logs per block")
+    parser.add_argument("--traces", type=int, default=1, help="traces per block")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes per second")
+    parser.add_argument(
+        "--decode-processes", type=int, default=0, help="processes decoding event logs"
+    )
+    parser.add_argument("--json", action="store_true", help="print raw results")
+    return parser.parse_args(args)
+
+
+def run(name: str, options: argparse.Namespace) -> dict[str, Any]:
+    # imported here to keep the parent process light
+    from ape import networks
+    from ape.api.query import (
+        AccountTransactionQuery,
+        BlockQuery,
+        ContractCreationQuery,
+        ContractEventQuery,
+    )
+    from archive import ACCOUNT, TOKEN, ArchiveConfig, FakeArchive, created_address
+    from eth_utils import to_checksum_address
+    from ethpm_types.abi import EventABI
+
+    from ape_subsquid.creations import CreationCache
+    from ape_subsquid.gateway import SubsquidGateway
+    from ape_subsquid.metrics import instrumentation
+    from ape_subsquid.nonces import NonceIndex
+    from ape_subsquid.query import SubsquidQueryEngine, gateway_ingest, get_block_query
+    from ape_subsquid.retry import RetryPolicy
+
+    config = ArchiveConfig(
+        transactions=options.transactions,
+        logs=options.logs,
+        traces=options.traces,
+        latency=options.latency,
+        error_rate=options.error_rate,
+        bandwidth=options.bandwidth,
+    )
+    start_block = 1
+    stop_block = start_block + options.blocks - 1
+    data_folder = Path(tempfile.mkdtemp())
+
+    phases: dict[str, float] = defaultdict(float)
+
+    def record(event: str, fields: dict[str, Any]):
+        if "seconds" in fields and event != "gateway.chunk":
+            phases[event] += fields["seconds"]
+
+    with FakeArchive(config) as archive, networks.ethereum.local.use_provider("test"):
+        gateway = SubsquidGateway()
+        gateway._archive_url = archive.url
+        gateway._retry_policy = RetryPolicy(base_delay=0.1, max_delay=1.0)
+        SubsquidQueryEngine._gateway = gateway
+        SubsquidQueryEngine._nonce_index = NonceIndex(data_folder / "nonces.sqlite")
+        SubsquidQueryEngine._creation_cache = CreationCache(data_folder / "creations.sqlite")
+        SubsquidQueryEngine._decode_processes = options.decode_processes
+        engine = SubsquidQueryEngine()
+        event = EventABI.model_validate(TRANSFER_ABI)
+
+        benchmarks: dict[str, Callable[[], Iterable]] = {
+            "ingest": lambda: (
+                block
+                for data in gateway_ingest(
+                    gateway,
+                    "ethereum-local",
+                    get_block_query(
+                        BlockQuery(columns=["*"], start_block=start_block, stop_block=stop_block),
+                        ["*"],
+                    ),
+                    prefetch=SubsquidQueryEngine._prefetch,
+                    concurrency=SubsquidQueryEngine._concurrency,
+                )
+                for block in data
+            ),
+            "blocks": lambda: engine.perform_query(
+                BlockQuery(columns=["*"], start_block=start_block, stop_block=stop_block)
+            ),
+            "events": lambda: engine.perform_query(
+                ContractEventQuery(
+                    columns=["*"],
+                    start_block=start_block,
+                    stop_block=stop_block,
+                    contract=to_checksum_address(TOKEN),
+                    event=event,
+                )
+            ),
+            "account": lambda: engine.perform_query(
+                AccountTransactionQuery(
+                    columns=["*"],
+                    account=to_checksum_address(ACCOUNT),
+                    start_nonce=start_block,
+                    stop_nonce=stop_block,
+                )
+            ),
+            "creation": lambda: engine.perform_query(
+                ContractCreationQuery(
+                    columns=["*"],
+                    contract=to_checksum_address(created_address(stop_block, 0)),
+                    start_block=start_block,
+                    stop_block=stop_block,
+                )
+            ),
+            "creations": lambda: engine.resolve_contract_creations(
+                [
+                    created_address(number, 0)
+                    for number in range(start_block, stop_block + 1, max(options.blocks // 1000, 1))
+                ],
+                start_block=start_block,
+                stop_block=stop_block,
+            ),
+        }
+
+        instrumentation.add_hook(record)
+        started = time.perf_counter()
+        rows = sum(1 for _ in benchmarks[name]())
+        seconds = time.perf_counter() - started
+        instrumentation.remove_hook(record)
+
+    phases["other"] = max(seconds - sum(phases.values()), 0)
+    return {
+        "benchmark": name,
+        "seconds": seconds,
+        "blocks_per_second": options.blocks / seconds,
+        "rows": rows,
+        "rows_per_second": rows / seconds,
+        "requests": archive.requests,
+        # kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "phases": dict(phases),
+    }
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        options = parse_args(sys.argv[3:])
+        result = run(sys.argv[2], options)
+        sys.stdout.write("RESULT " + json.dumps(result) + "\n")
+        return
+
+    options = parse_args(sys.argv[1:])
+    unknown = set(options.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        raise SystemExit(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    results = []
+    for name in options.benchmarks or BENCHMARKS:
+        process = subprocess.run(
+            [sys.executable, __file__, "--child", name, *sys.argv[1:]],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        lines = [line for line in process.stdout.splitlines() if line.startswith("RESULT ")]
+        if process.returncode or not lines:
+            sys.stderr.write(process.stderr)
+            raise SystemExit(f"Benchmark {name} failed")
+        results.append(json.loads(lines[-1].split(" ", 1)[1]))
+
+    if options.json:
+        sys.stdout.write(json.dumps(results, indent=2) + "\n")
+        return
+
+    for result in results:
+        phases = ", ".join(
+            f"{phase} {seconds:.2f}s" for phase, seconds in sorted(result["phases"].items())
+        )
+        sys.stdout.write(
+            f"{result['benchmark']:<10} {result['seconds']:7.2f}s "
+            f"{result['blocks_per_second']:10.0f} blocks/s "
+            f"{result['rows_per_second']:10.0f} rows/s "
+            f"{result['peak_rss_mb']:7.0f} MB peak RSS, {result['requests']} requests\n"
+            f"{'':<10} {phases}\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
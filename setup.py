@@ -14,6 +14,7 @@ extras_require = {
         "mypy>=1.7.1,<2",  # Static type analyzer
         "types-setuptools",  # Needed for mypy type shed
         "types-requests",  # Needed for mypy type shed
+        "pandas-stubs==1.2.0.62",  # Needed for mypy type shed
         "flake8>=6.1.0,<7",  # Style linter
         "flake8-breakpoint>=1.1.0,<2",  # Detect breakpoints left in code
         "flake8-print>=5.0.0,<6",  # Detect print statements left in code
@@ -28,6 +29,12 @@ extras_require = {
         "wheel",  # Packaging tool
         "twine",  # Package upload tool
     ],
+    "zstd": [  # zstd compressed archive responses
+        "urllib3[zstd]>=2.0",
+    ],
+    "aio": [  # asynchronous queries
+        "aiohttp>=3.8",
+    ],
     "dev": [
         "commitizen",  # Manage commits and publishing releases
         "pre-commit",  # Ensure that linters are run prior to committing
@@ -42,6 +49,7 @@ extras_require["dev"] = (
     extras_require["test"]
     + extras_require["lint"]
     + extras_require["release"]
+    + extras_require["aio"]
     + extras_require["dev"]
 )
 
@@ -62,6 +70,7 @@ setup(
     include_package_data=True,
     install_requires=[
         "eth-ape>=0.7.0,<0.8",
+        "orjson>=3.9",
     ],
     python_requires=">=3.8,<4",
     extras_require=extras_require,
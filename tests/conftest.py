@@ -0,0 +1,60 @@
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, cast
+
+import pytest
+
+from ape_subsquid.gateway import Block, Query, SubsquidGateway
+
+# the fake archive of the benchmarks serves the tests which need a server
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+
+class FakeGateway:
+    """
+    Serves chunks of ``chunk_size`` blocks holding only the last block header
+    and keeps track of the requests in flight.
+    """
+
+    def __init__(self, height: int = 1_000_000, chunk_size: int = 100, latency: float = 0.0):
+        self.height = height
+        self.chunk_size = chunk_size
+        self.latency = latency
+        self.requests: list[Query] = []
+        self.in_flight = 0
+        # max number of requests in flight seen once the first chunk was served
+        self.max_in_flight = 0
+        self._served = False
+        self._lock = threading.Lock()
+
+    def get_height(self, network: str, **kwargs) -> int:
+        return self.height
+
+    def query(self, network: str, query: Query, **kwargs) -> list[Block]:
+        with self._lock:
+            self.requests.append(query.copy())
+            self.in_flight += 1
+            if self._served:
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        time.sleep(self.latency)
+        last_block = min(
+            query["fromBlock"] + self.chunk_size - 1, query.get("toBlock", self.height)
+        )
+        with self._lock:
+            self.in_flight -= 1
+            self._served = True
+
+        data: Any = [{"header": {"number": last_block}}]
+        return cast(list[Block], data)
+
+
+@pytest.fixture
+def fake_gateway() -> FakeGateway:
+    return FakeGateway()
+
+
+def as_gateway(gateway: FakeGateway) -> SubsquidGateway:
+    return cast(SubsquidGateway, gateway)
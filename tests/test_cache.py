@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+from ape_subsquid.cache import BlockRangeCache
+from ape_subsquid.gateway import Block, Query
+
+NETWORK = "ethereum-mainnet"
+HEIGHT = 100_000
+
+
+def make_blocks(numbers) -> list[Block]:
+    return [
+        {"header": {"number": number, "hash": "0x%064x" % number}}  # type: ignore[typeddict-item]
+        for number in numbers
+    ]
+
+
+def make_query(from_block: int, to_block=None) -> Query:
+    query: Query = {"fromBlock": from_block, "logs": [{"address": ["0x00"]}]}
+    if to_block is not None:
+        query["toBlock"] = to_block
+    return query
+
+
+def get_numbers(hit):
+    return None if hit is None else [block["header"]["number"] for block in hit.blocks]
+
+
+@pytest.fixture
+def cache(tmp_path) -> BlockRangeCache:
+    return BlockRangeCache(tmp_path / "cache", finality_margin=1000)
+
+
+def test_hit(cache):
+    cache.put(NETWORK, make_query(100, 200), make_blocks([110, 150, 200]), HEIGHT)
+
+    assert get_numbers(cache.get(NETWORK, make_query(100, 200))) == [110, 150, 200]
+    assert get_numbers(cache.get(NETWORK, make_query(120))) == [150, 200]
+    assert get_numbers(cache.get(NETWORK, make_query(150, 300))) == [150, 200]
+    assert cache.get(NETWORK, make_query(201, 300)) is None
+    assert cache.get("other", make_query(100, 200)) is None
+    # another query shape
+    assert cache.get(NETWORK, {"fromBlock": 100, "toBlock": 200}) is None
+
+
+def test_partial_hit_is_trimmed(cache):
+    cache.put(NETWORK, make_query(0, 1000), make_blocks([5, 500, 1000]), HEIGHT)
+
+    assert cache.get(NETWORK, make_query(0, 500)) == (make_blocks([5, 500]), 500)
+    # the segment has no block at the requested end, the caller fetches it
+    assert cache.get(NETWORK, make_query(0, 700)) == (make_blocks([5, 500]), 700)
+    assert cache.get(NETWORK, make_query(501, 700)) == ([], 700)
+
+
+def test_unfinalized_range_is_not_stored(cache):
+    cache.put(NETWORK, make_query(100), make_blocks([HEIGHT - 10]), HEIGHT)
+    assert cache.get(NETWORK, make_query(100)) is None
+
+
+def test_overlapping_segments(cache):
+    cache.put(NETWORK, make_query(100, 300), make_blocks([100, 200, 300]), HEIGHT)
+    cache.put(NETWORK, make_query(150, 250), make_blocks([200, 250]), HEIGHT)
+    assert [segment[:2] for segment in cache._segments(NETWORK, make_query(0))] == [(100, 300)]
+
+    # a wider segment replaces the ones it covers
+    cache.put(NETWORK, make_query(0, 400), make_blocks([100, 200, 300, 400]), HEIGHT)
+    assert [segment[:2] for segment in cache._segments(NETWORK, make_query(0))] == [(0, 400)]
+    assert get_numbers(cache.get(NETWORK, make_query(150, 300))) == [200, 300]
+
+
+def test_next_segment_start(cache):
+    cache.put(NETWORK, make_query(100, 200), make_blocks([200]), HEIGHT)
+    cache.put(NETWORK, make_query(500, 600), make_blocks([600]), HEIGHT)
+
+    assert cache.next_segment_start(NETWORK, make_query(0)) == 100
+    assert cache.next_segment_start(NETWORK, make_query(150)) == 500
+    assert cache.next_segment_start(NETWORK, make_query(500)) is None
+
+
+def test_least_recently_used_segments_are_evicted(cache):
+    for start in range(0, 4000, 1000):
+        cache.put(NETWORK, make_query(start), make_blocks([start + 999]), HEIGHT)
+    segments = sorted(cache._segments(NETWORK, make_query(0)))
+    for index, (_, _, file) in enumerate(segments):
+        os.utime(file, (index, index))
+    segment_size = max(file.stat().st_size for _, _, file in segments)
+
+    # reading a segment makes it the most recently used
+    assert cache.get(NETWORK, make_query(0)) is not None
+    # room for three segments, their sizes differ by a few bytes
+    cache.max_size = segment_size * 3
+    cache.put(NETWORK, make_query(4000), make_blocks([4999]), HEIGHT)
+
+    starts = sorted(start for start, _, _ in cache._segments(NETWORK, make_query(0)))
+    assert starts == [0, 3000, 4000]
+
+
+def test_corrupted_segment_is_removed(cache):
+    cache.put(NETWORK, make_query(100, 200), make_blocks([200]), HEIGHT)
+    [(_, _, file)] = cache._segments(NETWORK, make_query(0))
+    file.write_bytes(b"garbage")
+
+    assert cache.get(NETWORK, make_query(100, 200)) is None
+    assert not file.exists()
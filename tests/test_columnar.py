@@ -0,0 +1,93 @@
+from typing import cast
+
+import pytest
+from ape import networks
+from ape.api.query import BlockQuery
+from ape_ethereum.ecosystem import Block as EthereumBlock
+from eth_abi import encode
+from eth_utils import encode_hex, keccak
+from ethpm_types.abi import EventABI
+
+from ape_subsquid.columnar import EMPTY_HEADER, blocks_to_frame, get_block_class, logs_to_frame
+from ape_subsquid.fields import BLOCK_REQUIRED_FIELDS, all_fields
+from ape_subsquid.gateway import Block, BlockFieldSelection
+from ape_subsquid.mappings import map_block_logs
+from ape_subsquid.query import get_block_query
+
+CONTRACT = "0x" + "c0" * 20
+OWNER = "0x" + "ab" * 20
+EVENT = EventABI.model_validate(
+    {
+        "type": "event",
+        "name": "Updated",
+        "anonymous": False,
+        "inputs": [
+            {"name": "owner", "type": "address", "indexed": True},
+            {
+                "name": "entry",
+                "type": "tuple",
+                "indexed": False,
+                "components": [
+                    {"name": "account", "type": "address"},
+                    {"name": "key", "type": "bytes32"},
+                    {"name": "amount", "type": "uint256"},
+                ],
+            },
+            {"name": "members", "type": "address[]", "indexed": False},
+        ],
+    }
+)
+
+
+@pytest.fixture(scope="module")
+def ecosystem():
+    return networks.ethereum
+
+
+def make_block(number: int, base_fee=None) -> Block:
+    header = {**EMPTY_HEADER, "number": number, "baseFeePerGas": base_fee}
+    data = encode(
+        ["(address,bytes32,uint256)", "address[]"],
+        [(OWNER, b"\x01" * 32, 5), [OWNER, CONTRACT]],
+    )
+    log = {
+        "address": CONTRACT,
+        "transactionIndex": 0,
+        "transactionHash": "0x" + "11" * 32,
+        "logIndex": 0,
+        "topics": [
+            encode_hex(keccak(text=EVENT.selector)),
+            "0x" + "00" * 12 + OWNER[2:],
+        ],
+        "data": encode_hex(data),
+    }
+    return cast(Block, {"header": header, "logs": [log]})
+
+
+def test_block_class(ecosystem):
+    assert get_block_class(ecosystem) is EthereumBlock
+
+
+def test_missing_base_fee_is_none():
+    frame = blocks_to_frame([[make_block(1), make_block(2, "0x7")]], ["number", "base_fee"])
+    assert frame["number"].tolist() == [1, 2]
+    assert frame["base_fee"].isna().tolist() == [True, False]
+    assert frame["base_fee"][1] == 7
+
+
+def test_event_arguments_match_ecosystem_decoding(ecosystem):
+    block = make_block(1)
+    frame = logs_to_frame([[block]], EVENT, ["event_arguments"], ecosystem)
+    [expected] = ecosystem.decode_logs(map_block_logs(block), EVENT)
+
+    [arguments] = frame["event_arguments"].tolist()
+    assert arguments == expected.event_arguments
+    assert arguments["owner"] == ecosystem.decode_address(OWNER)
+    assert arguments["members"] == [ecosystem.decode_address(a) for a in (OWNER, CONTRACT)]
+
+
+def test_block_fields_are_only_projected_for_frames():
+    query = BlockQuery(columns=["number"], start_block=0, stop_block=10)
+    # the blocks of a model query must be complete, ape caches them
+    assert get_block_query(query)["fields"]["block"] == all_fields(BlockFieldSelection)
+    assert set(get_block_query(query, ["number"])["fields"]["block"]) == set(BLOCK_REQUIRED_FIELDS)
@@ -0,0 +1,111 @@
+from typing import Any, cast
+
+from archive import ArchiveConfig, FakeArchive, created_address
+from hexbytes import HexBytes
+
+from ape_subsquid.creations import (
+    ContractCreation,
+    CreationCache,
+    creation_has_columns,
+    get_block_creations,
+    get_creation_receipt,
+)
+from ape_subsquid.fields import all_fields, receipt_fields
+from ape_subsquid.gateway import Block, SubsquidGateway, TxFieldSelection
+from ape_subsquid.query import SubsquidQueryEngine
+
+NETWORK = "ethereum-mainnet"
+CONTRACT = "0x" + "C0" * 20
+BLOCK_HASH = "0x" + "11" * 32
+
+
+def make_block(number: int) -> Block:
+    return cast(
+        Block,
+        {
+            "header": {"number": number, "hash": BLOCK_HASH},
+            "transactions": [
+                {"transactionIndex": 0, "hash": "0x" + "20" * 32, "status": 1},
+                {"transactionIndex": 1, "hash": "0x" + "21" * 32, "status": 1},
+            ],
+            "logs": [
+                {"transactionIndex": 1, "logIndex": 0, "address": CONTRACT, "topics": []},
+                {"transactionIndex": 0, "logIndex": 1, "address": CONTRACT, "topics": []},
+            ],
+            "traces": [{"transactionIndex": 1, "type": "create", "result": {"address": CONTRACT}}],
+        },
+    )
+
+
+def get_creation(number: int, columns: list[str], with_logs: bool) -> ContractCreation:
+    [(address, creation)] = get_block_creations(
+        make_block(number), receipt_fields(columns), with_logs
+    )
+    assert address == CONTRACT
+    return creation
+
+
+def test_block_creations():
+    creation = get_creation(10, ["status"], with_logs=True)
+
+    assert creation["blockNumber"] == 10
+    assert creation["transaction"]["hash"] == "0x" + "21" * 32
+    assert [log["logIndex"] for log in creation["logs"] or []] == [0]
+    assert "status" in creation["fields"]
+    assert get_creation(10, ["status"], with_logs=False)["logs"] is None
+
+
+def test_creation_has_columns():
+    creation = get_creation(10, ["status", "txn_hash"], with_logs=False)
+
+    assert creation_has_columns(creation, ["status"])
+    assert not creation_has_columns(creation, ["logs"])
+    assert not creation_has_columns(creation, ["transaction"])
+    assert creation_has_columns(get_creation(10, ["*"], with_logs=True), ["logs", "transaction"])
+
+
+def test_creation_receipt():
+    receipt = get_creation_receipt(get_creation(10, ["status"], with_logs=True))
+
+    assert receipt["blockNumber"] == 10
+    assert receipt["blockHash"] == HexBytes(BLOCK_HASH)
+    assert receipt["transactionHash"] == HexBytes("0x" + "21" * 32)
+    assert [log["logIndex"] for log in receipt["logs"]] == [0]
+
+
+def test_creation_cache(tmp_path):
+    cache = CreationCache(tmp_path / "creations.sqlite", finality_margin=100)
+    final = get_creation(10, ["status"], with_logs=True)
+    recent = get_creation(950, ["status"], with_logs=True)
+    cache.put(NETWORK, [(CONTRACT, final), ("0x" + "d0" * 20, recent)], height=1000)
+
+    # addresses are case insensitive
+    assert cache.get(NETWORK, CONTRACT.lower()) == cast(Any, final)
+    assert cache.get(NETWORK, "0x" + "D0" * 20) is None
+    assert cache.get("other", CONTRACT) is None
+
+    cache.clear()
+    assert cache.get(NETWORK, CONTRACT) is None
+
+
+def test_creations_are_resolved_in_batches(tmp_path):
+    with FakeArchive(ArchiveConfig(height=100_000, transactions=2, logs=2)) as archive:
+
+        class Engine(SubsquidQueryEngine):
+            _gateway = SubsquidGateway()
+            _creation_cache = CreationCache(tmp_path / "creations.sqlite")
+            _creation_batch_size = 2
+            _prefetch = 0
+            _concurrency = 1
+
+        Engine._gateway._archive_url = archive.url
+        addresses = [created_address(block, 0) for block in (2500, 2600, 3500)]
+        creations = Engine()._find_contract_creations(
+            NETWORK, addresses, 0, 100_000, all_fields(TxFieldSelection), True
+        )
+        found = [(address, creation["blockNumber"]) for address, creation in creations]
+        requests = archive.requests
+
+    assert found == list(zip(addresses, [2500, 2600, 3500]))
+    # a scan of 1000 block chunks per batch, each stops at its last creation
+    assert requests == 3 + 4
@@ -0,0 +1,70 @@
+from typing import Any, cast
+
+from archive import get_header, get_log
+from ethpm_types.abi import EventABI
+
+from ape_subsquid.decoding import ParallelLogDecoder, batch_logs, decode_logs
+from ape_subsquid.mappings import LogRecord, map_block_logs
+from ape_subsquid.utils import batched
+
+
+def make_chunk(blocks: list[int], last_block: int) -> tuple[list[LogRecord], int]:
+    logs: list[Any] = [{"blockNumber": block} for block in blocks]
+    return cast(list[LogRecord], logs), last_block
+
+
+def get_blocks(batches: list[list[LogRecord]]) -> list[list[int]]:
+    return [[log["blockNumber"] for log in batch] for batch in batches]
+
+
+def test_batches_span_chunks():
+    chunks = [make_chunk([1, 2], 10), make_chunk([11, 12, 13], 20), make_chunk([21], 30)]
+    batches = list(batch_logs(chunks, 4, max_seconds=60, max_blocks=1000))
+    assert get_blocks(batches) == [[1, 2, 11, 12], [13, 21]]
+
+
+def test_partial_batch_is_flushed_after_max_blocks():
+    chunks = [make_chunk([1], 10), make_chunk([], 20), make_chunk([25], 30)]
+    batches = batch_logs(iter(chunks), 100, max_seconds=60, max_blocks=15)
+    # the first batch is yielded before the last chunk is requested
+    assert get_blocks([next(batches)]) == [[1]]
+    assert get_blocks(list(batches)) == [[25]]
+
+
+def test_partial_batch_is_flushed_after_max_seconds():
+    chunks = [make_chunk([1], 10), make_chunk([11], 20)]
+    batches = list(batch_logs(chunks, 100, max_seconds=0, max_blocks=1000))
+    assert get_blocks(batches) == [[1], [11]]
+
+
+def test_parallel_decoding_matches_serial():
+    event = EventABI.model_validate(
+        {
+            "type": "event",
+            "name": "Transfer",
+            "inputs": [
+                {"name": "from", "type": "address", "indexed": True},
+                {"name": "to", "type": "address", "indexed": True},
+                {"name": "value", "type": "uint256", "indexed": False},
+            ],
+        }
+    )
+    blocks: list[Any] = [
+        {"header": get_header(number), "logs": [get_log(number, i, 2) for i in range(5)]}
+        for number in range(1, 41)
+    ]
+    logs = [log for block in blocks for log in map_block_logs(block)]
+    batches = list(batched(logs, 7))
+
+    decoder = ParallelLogDecoder(2)
+    try:
+        decoded = list(decoder.decode("ethereum", batches, event))
+    finally:
+        decoder.close()
+
+    serial = [log for batch in batches for log in decode_logs("ethereum", batch, event)]
+    assert len(decoded) == len(logs) == 200
+    assert decoded == serial
+    assert [(log.block_number, log.log_index) for log in decoded] == [
+        (log["blockNumber"], log["logIndex"]) for log in logs
+    ]
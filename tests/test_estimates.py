@@ -0,0 +1,62 @@
+from ape_subsquid.estimates import ThroughputModel, get_query_kind
+from ape_subsquid.gateway import Query
+
+NETWORK = "ethereum-mainnet"
+LOGS_QUERY: Query = {
+    "fromBlock": 0,
+    "logs": [{"address": ["0x00"], "topic0": ["0x01"], "topic2": ["0x02"]}],
+}
+
+
+def test_query_kind():
+    assert get_query_kind({"fromBlock": 0}) == "blocks"
+    assert get_query_kind({"fromBlock": 0, "transactions": [{}]}) == "blocks"
+    assert get_query_kind({"fromBlock": 0, "transactions": [{"from": ["0x00"]}]}) == "transactions"
+    assert get_query_kind({"fromBlock": 0, "traces": [{"type": ["create"]}]}) == "traces"
+    assert get_query_kind(LOGS_QUERY) == "logs/2"
+    # the least selective request decides
+    query: Query = {"fromBlock": 0, "logs": [*LOGS_QUERY["logs"], {"address": ["0x00"]}]}
+    assert get_query_kind(query) == "logs/0"
+
+
+def test_estimate(tmp_path):
+    model = ThroughputModel(tmp_path / "estimates.sqlite", min_samples=2)
+    model.record(NETWORK, LOGS_QUERY, blocks=1000, latency=0.5)
+    assert model.estimate(NETWORK, "logs/2", 10_000) is None
+
+    model.record(NETWORK, LOGS_QUERY, blocks=1000, latency=0.5)
+    assert model.estimate(NETWORK, "logs/2", 10_000) == 5000
+    assert model.estimate(NETWORK, "logs/2", 10_000, concurrency=4) == 1500
+    assert model.estimate(NETWORK, "logs/1", 10_000) is None
+
+
+def test_stats_are_written_in_batches(tmp_path):
+    path = tmp_path / "estimates.sqlite"
+    model = ThroughputModel(path, flush_interval=3600)
+    for _ in range(3):
+        model.record(NETWORK, LOGS_QUERY, blocks=1000, latency=0.5)
+    assert ThroughputModel(path).get(NETWORK, "logs/2") is None
+
+    model.flush()
+    stats = ThroughputModel(path).get(NETWORK, "logs/2")
+    assert stats is not None and stats.samples == 3
+
+    model = ThroughputModel(path, flush_interval=0)
+    model.record(NETWORK, LOGS_QUERY, blocks=1000, latency=0.5)
+    stats = ThroughputModel(path).get(NETWORK, "logs/2")
+    assert stats is not None and stats.samples == 4
+
+
+def test_truncated_chunks_only_raise_the_chunk_size(tmp_path):
+    model = ThroughputModel(tmp_path / "estimates.sqlite", decay=0.5)
+    model.record(NETWORK, LOGS_QUERY, blocks=5000, latency=1.0, size=2000)
+    for _ in range(3):
+        model.record(NETWORK, LOGS_QUERY, blocks=11, latency=0.1, size=10, truncated=True)
+
+    stats = model.get(NETWORK, "logs/2")
+    assert stats is not None
+    assert (stats.blocks, stats.latency, stats.size, stats.samples) == (5000, 1.0, 2000, 1)
+
+    # a truncated chunk longer than the average is still a valid lower bound
+    model.record(NETWORK, LOGS_QUERY, blocks=7000, latency=1.0, size=2000, truncated=True)
+    assert stats.blocks == 6000 and stats.samples == 2
@@ -0,0 +1,186 @@
+from types import SimpleNamespace
+from typing import Any, cast
+
+import pytest
+from ape import networks
+from ape.api.query import ContractEventQuery
+from eth_abi import encode
+from eth_utils import encode_hex, keccak
+from ethpm_types.abi import EventABI
+
+from ape_subsquid.gateway import Block, Query
+from ape_subsquid.query import SubsquidQueryEngine, get_log_request, log_matches_request
+
+NETWORK = "ethereum-mainnet"
+TOKEN = "0x" + "70" * 20
+ALICE = "0x" + "a1" * 20
+BOB = "0x" + "b0" * 20
+
+
+def make_event(name: str, *inputs: tuple[str, str, bool], anonymous: bool = False) -> EventABI:
+    return EventABI.model_validate(
+        {
+            "type": "event",
+            "name": name,
+            "anonymous": anonymous,
+            "inputs": [
+                {"name": input_name, "type": _type, "indexed": indexed}
+                for input_name, _type, indexed in inputs
+            ],
+        }
+    )
+
+
+TRANSFER = make_event(
+    "Transfer", ("from", "address", True), ("to", "address", True), ("value", "uint256", False)
+)
+APPROVAL = make_event(
+    "Approval",
+    ("owner", "address", True),
+    ("spender", "address", True),
+    ("value", "uint256", False),
+)
+MINTED = make_event("Minted", ("to", "address", True), ("value", "uint256", False), anonymous=True)
+
+
+def address_topic(address: str) -> str:
+    return "0x" + "00" * 12 + address[2:]
+
+
+def make_log(index: int, topics: list[str], value: int) -> dict[str, Any]:
+    return {
+        "address": TOKEN,
+        "logIndex": index,
+        "transactionIndex": index,
+        "transactionHash": "0x%064x" % index,
+        "topics": topics,
+        "data": encode_hex(encode(["uint256"], [value])),
+    }
+
+
+def selector(event: EventABI) -> str:
+    return encode_hex(keccak(text=event.selector))
+
+
+BLOCKS: list[dict[str, Any]] = [
+    {
+        "header": {"number": 1, "hash": "0x" + "01" * 32},
+        "logs": [
+            make_log(0, [selector(TRANSFER), address_topic(ALICE), address_topic(BOB)], 10),
+            make_log(1, [selector(APPROVAL), address_topic(ALICE), address_topic(BOB)], 20),
+        ],
+    },
+    {
+        "header": {"number": 2, "hash": "0x" + "02" * 32},
+        "logs": [
+            make_log(0, [address_topic(BOB)], 30),
+            make_log(1, [selector(TRANSFER), address_topic(BOB), address_topic(ALICE)], 40),
+        ],
+    },
+]
+
+
+class StubGateway:
+    """
+    Responds with all the logs of ``BLOCKS`` in the range, the engine matches them to the queries.
+    """
+
+    def __init__(self) -> None:
+        self.requests: list[Query] = []
+
+    def get_height(self, network: str, **kwargs) -> int:
+        return 100
+
+    def query(self, network: str, query: Query, **kwargs) -> list[Block]:
+        self.requests.append(query)
+        blocks = [
+            block
+            for block in BLOCKS
+            if query["fromBlock"] <= block["header"]["number"] <= query["toBlock"]
+        ]
+        return cast(list[Block], blocks)
+
+
+@pytest.fixture
+def engine(monkeypatch) -> SubsquidQueryEngine:
+    monkeypatch.setattr("ape_subsquid.query.get_network", lambda network_manager: NETWORK)
+
+    class Engine(SubsquidQueryEngine):
+        provider = SimpleNamespace(network=SimpleNamespace(ecosystem=networks.ethereum))
+
+    engine = Engine()
+    engine._gateway = cast(Any, StubGateway())
+    engine._prefetch = 0
+    engine._concurrency = 1
+    return engine
+
+
+def make_query(event: EventABI, **search_topics) -> ContractEventQuery:
+    return ContractEventQuery(
+        columns=["*"],
+        contract=TOKEN,
+        event=event,
+        start_block=1,
+        stop_block=2,
+        search_topics=search_topics or None,
+    )
+
+
+def describe(results) -> list[tuple[int, str, int, int]]:
+    return [
+        (index, log.event_name, log.block_number, log.event_arguments["value"])
+        for index, log in results
+    ]
+
+
+def test_queries_share_one_scan(engine):
+    queries = [make_query(TRANSFER), make_query(APPROVAL)]
+    results = describe(engine.perform_event_queries(queries))
+
+    assert results == [(0, "Transfer", 1, 10), (1, "Approval", 1, 20), (0, "Transfer", 2, 40)]
+    [request] = engine._gateway.requests
+    assert request["logs"] == [get_log_request(query) for query in queries]
+
+
+def test_log_matching_several_queries(engine):
+    queries = [make_query(TRANSFER), make_query(TRANSFER, to=ALICE), make_query(TRANSFER, to=BOB)]
+    results = describe(engine.perform_event_queries(queries))
+
+    # in the order of logs, a log matching several queries follows the query order
+    assert results == [
+        (0, "Transfer", 1, 10),
+        (2, "Transfer", 1, 10),
+        (0, "Transfer", 2, 40),
+        (1, "Transfer", 2, 40),
+    ]
+
+
+def test_queries_over_different_ranges(engine):
+    later = make_query(APPROVAL)
+    later.start_block = 2
+    results = describe(engine.perform_event_queries([later, make_query(TRANSFER)]))
+
+    assert len(engine._gateway.requests) == 2
+    assert results == [(1, "Transfer", 1, 10), (1, "Transfer", 2, 40)]
+
+
+def test_anonymous_event_is_matched_by_address(engine):
+    request = get_log_request(make_query(MINTED))
+    assert request == {"address": [TOKEN]}
+    assert all(log_matches_request(log, request) for block in BLOCKS for log in block["logs"])
+
+    # it doesn't change what the other queries get
+    queries = [make_query(MINTED), make_query(APPROVAL)]
+    results = describe(engine.perform_event_queries(queries))
+    assert [item for item in results if item[0] == 1] == [(1, "Approval", 1, 20)]
+
+
+def test_overlapping_ranges_are_scanned_once(engine):
+    later = make_query(TRANSFER)
+    later.start_block = 2
+    results = describe(engine.perform_event_queries([make_query(TRANSFER), later]))
+
+    ranges = [(request["fromBlock"], request["toBlock"]) for request in engine._gateway.requests]
+    assert ranges == [(1, 1), (2, 2)]
+    assert [len(request["logs"]) for request in engine._gateway.requests] == [1, 2]
+    assert results == [(0, "Transfer", 1, 10), (0, "Transfer", 2, 40), (1, "Transfer", 2, 40)]
@@ -0,0 +1,73 @@
+import pytest
+
+from ape_subsquid.follow import FollowCursor, PollingPolicy, gateway_follow, iter_chunk
+
+from .conftest import as_gateway
+
+
+def test_polling_interval():
+    policy = PollingPolicy(min_interval=1, max_interval=30, backoff=2)
+    # follows the pace of new blocks
+    assert policy.get_interval(5, seconds=24, new_blocks=2) == 12
+    assert policy.get_interval(5, seconds=1, new_blocks=100) == 1
+    # backs off while nothing arrives
+    assert policy.get_interval(5, seconds=10, new_blocks=0) == 10
+    assert policy.get_interval(20, seconds=40, new_blocks=0) == 30
+
+
+def test_iter_chunk_moves_cursor_past_completed_blocks():
+    cursor = FollowCursor(next_block=1)
+    items = [(3, "a"), (3, "b"), (5, "c")]
+    seen = []
+    for item in iter_chunk(items, 10, cursor, lambda item: item[0]):
+        seen.append((item[1], cursor.next_block))
+
+    # the cursor passes a block right before its last item is yielded
+    assert seen == [("a", 1), ("b", 4), ("c", 11)]
+    assert cursor.next_block == 11
+
+
+def test_iter_chunk_without_items():
+    cursor = FollowCursor(next_block=1)
+    assert list(iter_chunk([], 10, cursor, lambda item: item)) == []
+    assert cursor.next_block == 11
+
+
+class Stop(Exception):
+    pass
+
+
+def test_follow_fetches_new_ranges_once(monkeypatch, fake_gateway):
+    # heights seen by the polls
+    heights = [250, 250, 420]
+    height = 0
+
+    def get_height(network, refresh=False, **kwargs):
+        nonlocal height
+        if refresh:
+            if not heights:
+                raise Stop()
+            height = heights.pop(0)
+        return height
+
+    monkeypatch.setattr(fake_gateway, "get_height", get_height)
+    pauses = []
+    monkeypatch.setattr("ape_subsquid.follow.sleep", pauses.append)
+
+    # the end of the range is ignored
+    query = {"fromBlock": 1, "toBlock": 10}
+    chunks = gateway_follow(as_gateway(fake_gateway), "ethereum-mainnet", query)
+    last_blocks = []
+    with pytest.raises(Stop):
+        for data in chunks:
+            last_blocks.append(data[-1]["header"]["number"])
+
+    assert last_blocks == [100, 200, 250, 350, 420]
+    assert [(q["fromBlock"], q["toBlock"]) for q in fake_gateway.requests] == [
+        (1, 250),
+        (101, 250),
+        (201, 250),
+        (251, 420),
+        (351, 420),
+    ]
+    assert len(pauses) == 3
@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from requests.exceptions import ConnectionError
+
+from ape_subsquid.cache import BlockRangeCache
+from ape_subsquid.estimates import ThroughputModel
+from ape_subsquid.exceptions import ApeSubsquidError, WorkerIsUnavailable
+from ape_subsquid.gateway import Query, SubsquidGateway, WorkerRegistry
+from ape_subsquid.transport import TransferStats
+
+NETWORK = "ethereum-mainnet"
+
+
+class SlowGateway(SubsquidGateway):
+    def __init__(self, error: bool = False) -> None:
+        super().__init__()
+        self.error = error
+        self.fetched: list[Query] = []
+        self._lock = threading.Lock()
+
+    def _fetch(self, network, query, **kwargs):
+        with self._lock:
+            self.fetched.append(query)
+        # long enough for the other threads to join the request
+        time.sleep(0.3)
+        if self.error:
+            raise ApeSubsquidError("Gateway request failed")
+        return [{"header": {"number": query["fromBlock"]}}]
+
+
+def make_query(from_block: int, address: str) -> Query:
+    return {"fromBlock": from_block, "logs": [{"address": [address]}]}
+
+
+def query_in_threads(gateway: SubsquidGateway, queries: list[Query]) -> list:
+    with ThreadPoolExecutor(len(queries)) as executor:
+        futures = [executor.submit(gateway.query, NETWORK, query) for query in queries]
+        return [future.exception() or future.result() for future in futures]
+
+
+def test_identical_queries_are_fetched_once():
+    gateway = SlowGateway()
+    # addresses differ in case only
+    results = query_in_threads(gateway, [make_query(1, "0xaa"), make_query(1, "0xAA")])
+
+    assert len(gateway.fetched) == 1
+    assert results[0] is results[1]
+    assert results[0] == [{"header": {"number": 1}}]
+
+
+def test_different_queries_are_fetched_separately():
+    gateway = SlowGateway()
+    query_in_threads(gateway, [make_query(1, "0xaa"), make_query(2, "0xaa")])
+    assert len(gateway.fetched) == 2
+
+
+def test_failure_is_shared():
+    gateway = SlowGateway(error=True)
+    results = query_in_threads(gateway, [make_query(1, "0xaa"), make_query(1, "0xaa")])
+
+    assert len(gateway.fetched) == 1
+    assert all(isinstance(result, ApeSubsquidError) for result in results)
+
+    # the failed request isn't kept
+    with pytest.raises(ApeSubsquidError):
+        gateway.query(NETWORK, make_query(1, "0xaa"))
+    assert len(gateway.fetched) == 2
+
+
+class CachedGateway(SubsquidGateway):
+    def __init__(self, cache: BlockRangeCache) -> None:
+        super().__init__(cache=cache)
+        self.fetched: list[Query] = []
+
+    def get_height(self, network, **kwargs):
+        return 100_000
+
+    def _fetch(self, network, query, **kwargs):
+        self.fetched.append(query)
+        numbers = [5, 500, 1000] if query["fromBlock"] == 0 else [query["toBlock"]]
+        return [{"header": {"number": number}} for number in numbers]
+
+
+def test_trimmed_cache_hit_fetches_the_last_block(tmp_path):
+    gateway = CachedGateway(BlockRangeCache(tmp_path / "cache"))
+    gateway.query(NETWORK, {"fromBlock": 0, "toBlock": 1000})
+    gateway.fetched.clear()
+
+    data = gateway.query(NETWORK, {"fromBlock": 0, "toBlock": 700})
+    assert [block["header"]["number"] for block in data] == [5, 500, 700]
+    assert gateway.fetched == [{"fromBlock": 700, "toBlock": 700}]
+
+
+def test_async_identical_queries_are_fetched_once(tmp_path):
+    aio = pytest.importorskip("ape_subsquid.aio")
+
+    class SlowAsyncGateway(aio.AsyncSubsquidGateway):
+        def __init__(self, throughput: ThroughputModel) -> None:
+            super().__init__(throughput=throughput)
+            self.fetched: list[Query] = []
+
+        async def _query(self, network, query):
+            self.fetched.append(query)
+            await asyncio.sleep(0.1)
+            return [{"header": {"number": query["fromBlock"] + 99}}], TransferStats(size=10)
+
+    gateway = SlowAsyncGateway(ThroughputModel(tmp_path / "estimates.sqlite"))
+
+    async def query_twice():
+        queries = [make_query(1, "0xaa"), make_query(1, "0xAA")]
+        return await asyncio.gather(*(gateway.query(NETWORK, query) for query in queries))
+
+    results = asyncio.run(query_twice())
+    assert len(gateway.fetched) == 1
+    assert results[0] is results[1]
+    # the chunk is measured like the blocking gateway does
+    stats = gateway.throughput.get(NETWORK, "logs/0")
+    assert stats is not None and (stats.blocks, stats.size) == (100, 10)
+
+
+class WorkersGateway(SubsquidGateway):
+    def __init__(self, workers: list[str], failing: tuple[str, ...] = ()) -> None:
+        super().__init__()
+        self.workers = workers
+        self.failing = failing
+        self.resolved: list[str] = []
+        self.posted: list[str] = []
+
+    def _get_worker(self, network, start_block):
+        worker = self.workers[len(self.resolved) % len(self.workers)]
+        self.resolved.append(worker)
+        return worker
+
+    def _post(self, worker_url, query, read):
+        self.posted.append(worker_url)
+        if worker_url in self.failing:
+            raise ConnectionError(f"{worker_url} is down")
+        return query["fromBlock"]
+
+
+def send(gateway: SubsquidGateway, from_block: int):
+    return gateway._send(NETWORK, {"fromBlock": from_block}, lambda response: response)
+
+
+def test_worker_registry():
+    registry = WorkerRegistry(limit=2)
+    registry.remember(NETWORK, 0, "w1")
+    registry.remember(NETWORK, 100, "w2")
+
+    assert registry.get(NETWORK, 50) == "w1"
+    assert registry.get(NETWORK, 150) == "w2"
+    assert registry.get("other", 150) is None
+
+    registry.forget(NETWORK, "w2")
+    assert registry.get(NETWORK, 150) == "w1"
+    # only the latest workers are kept
+    registry.remember(NETWORK, 200, "w3")
+    registry.remember(NETWORK, 300, "w4")
+    assert registry.get(NETWORK, 50) is None
+
+
+def test_remembered_worker_is_reused():
+    gateway = WorkersGateway(["w1", "w2"])
+    assert [send(gateway, block) for block in (0, 100, 200)] == [0, 100, 200]
+
+    assert gateway.resolved == ["w1"]
+    assert gateway.posted == ["w1", "w1", "w1"]
+
+
+def test_failed_worker_is_forgotten():
+    gateway = WorkersGateway(["w1", "w2"])
+    send(gateway, 0)
+    gateway.failing = ("w1",)
+
+    assert send(gateway, 100) == 100
+    assert gateway.resolved == ["w1", "w2"]
+    assert gateway.posted == ["w1", "w1", "w2"]
+    assert gateway._workers.get(NETWORK, 100) == "w2"
+    assert gateway._workers.get(NETWORK, 50) is None
+
+
+def test_worker_resolutions_give_up():
+    gateway = WorkersGateway(["w1", "w2"])
+    for worker in ("w1", "w2"):
+        for _ in range(3):
+            gateway._breaker.record_failure(worker)
+
+    with pytest.raises(WorkerIsUnavailable) as info:
+        send(gateway, 0)
+    assert len(gateway.resolved) == gateway._worker_resolutions
+    assert gateway.posted == []
+    assert info.value.retry_after is not None and info.value.retry_after > 0
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+import ape_subsquid.query
+from ape_subsquid.checkpoints import CheckpointStore
+from ape_subsquid.gateway import Query
+from ape_subsquid.query import gateway_ingest
+
+from .conftest import FakeGateway, as_gateway
+
+
+def get_last_blocks(gateway: FakeGateway, query: Query, **kwargs) -> list[int]:
+    chunks = gateway_ingest(as_gateway(gateway), "ethereum-mainnet", query, **kwargs)
+    return [data[-1]["header"]["number"] for data in chunks]
+
+
+def test_sequential_ingest(fake_gateway):
+    last_blocks = get_last_blocks(fake_gateway, {"fromBlock": 1, "toBlock": 250})
+    assert last_blocks == [100, 200, 250]
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_fan_out_keeps_requests_in_flight(monkeypatch, fake_gateway, prefetch):
+    monkeypatch.setattr(ape_subsquid.query, "PARALLEL_RANGE_SIZE", 1000)
+    fake_gateway.latency = 0.01
+    last_blocks = get_last_blocks(
+        fake_gateway, {"fromBlock": 1, "toBlock": 6000}, prefetch=prefetch, concurrency=4
+    )
+
+    assert last_blocks == list(range(100, 6001, 100))
+    # the window keeps several sub-ranges downloading after the first chunk is served
+    assert 1 < fake_gateway.max_in_flight <= 4
+
+
+def test_fan_out_stops_when_closed(monkeypatch, fake_gateway):
+    monkeypatch.setattr(ape_subsquid.query, "PARALLEL_RANGE_SIZE", 1000)
+    fake_gateway.latency = 0.01
+    chunks = gateway_ingest(
+        as_gateway(fake_gateway), "ethereum-mainnet", {"fromBlock": 1, "toBlock": 100_000}, 0, 2
+    )
+    next(chunks)
+    chunks.close()
+    requests = len(fake_gateway.requests)
+    time.sleep(0.1)
+
+    # only the requests already sent can finish
+    assert len(fake_gateway.requests) == requests
+
+
+def test_fan_out_buffers_are_bounded(monkeypatch, fake_gateway):
+    monkeypatch.setattr(ape_subsquid.query, "PARALLEL_RANGE_SIZE", 1000)
+    chunks = gateway_ingest(
+        as_gateway(fake_gateway), "ethereum-mainnet", {"fromBlock": 1, "toBlock": 100_000}, 2, 4
+    )
+    next(chunks)
+    time.sleep(0.1)
+
+    # every sub-range holds two chunks and waits with a third one
+    assert len(fake_gateway.requests) <= 4 * 3 + 1
+    chunks.close()
+
+
+def test_interrupted_ingest_is_resumed(tmp_path, fake_gateway):
+    checkpoints = CheckpointStore(tmp_path / "checkpoints.sqlite")
+    query: Query = {"fromBlock": 1, "toBlock": 500}
+    chunks = gateway_ingest(
+        as_gateway(fake_gateway), "ethereum-mainnet", query, checkpoints=checkpoints
+    )
+    assert [next(chunks)[-1]["header"]["number"] for _ in range(3)] == [100, 200, 300]
+    # the last chunk isn't completed until the next one is requested
+    chunks.close()
+    assert checkpoints.get("ethereum-mainnet", query) == 200
+    assert checkpoints.get("ethereum-mainnet", {"fromBlock": 1, "toBlock": 600}) is None
+
+    fake_gateway.requests.clear()
+    last_blocks = get_last_blocks(fake_gateway, query, checkpoints=checkpoints)
+    assert last_blocks == [300, 400, 500]
+    assert fake_gateway.requests[0]["fromBlock"] == 201
+    # a completed ingest starts over next time
+    assert checkpoints.get("ethereum-mainnet", query) is None
+
+
+def test_completed_checkpoint_is_dropped(tmp_path, fake_gateway):
+    checkpoints = CheckpointStore(tmp_path / "checkpoints.sqlite")
+    query: Query = {"fromBlock": 1, "toBlock": 500}
+    checkpoints.put("ethereum-mainnet", query, 500)
+
+    assert get_last_blocks(fake_gateway, query, checkpoints=checkpoints) == []
+    assert fake_gateway.requests == []
+    assert checkpoints.get("ethereum-mainnet", query) is None
@@ -0,0 +1,95 @@
+from typing import Any, cast
+
+import pytest
+from hexbytes import HexBytes
+
+from ape_subsquid.gateway import Block
+from ape_subsquid.mappings import BlockReceipts, LogRecord, map_block_logs, map_header
+
+HASH = "0x" + "11" * 32
+TX_HASH = "0x" + "22" * 32
+
+
+def make_log(index: int, transaction_index: int) -> dict[str, Any]:
+    return {
+        "address": "0x" + "70" * 20,
+        "transactionIndex": transaction_index,
+        "transactionHash": TX_HASH,
+        "logIndex": index,
+        "data": "0x01",
+        "topics": ["0x" + "33" * 32],
+    }
+
+
+BLOCK = cast(
+    Block,
+    {
+        "header": {"number": 7, "hash": HASH, "gasUsed": "0x10", "baseFeePerGas": None},
+        "transactions": [
+            {"transactionIndex": 0, "hash": TX_HASH, "value": "0x5", "from": "0x00"},
+            {"transactionIndex": 1, "hash": TX_HASH, "value": "0x0", "from": "0x00"},
+        ],
+        "logs": [make_log(0, 0), make_log(1, 1), make_log(2, 0)],
+    },
+)
+
+
+def test_fields_are_converted_lazily():
+    raw = {"number": 7, "hash": HASH, "gasUsed": "0x10", "unknown": 1}
+    record = map_header(cast(Any, raw), [])
+
+    assert record._values == {"transactions": []}
+    assert record["gasUsed"] == 16
+    assert record["hash"] == HexBytes(HASH)
+    assert record._values["gasUsed"] == 16
+    # the raw item isn't modified
+    assert raw["gasUsed"] == "0x10"
+    # only known fields are exposed
+    assert "unknown" not in record
+    assert sorted(record) == ["gasUsed", "hash", "number", "transactions"]
+    assert len(record) == 4
+
+
+def test_none_is_not_converted():
+    record = map_header(BLOCK["header"], [])
+    assert record["baseFeePerGas"] is None
+
+
+def test_changes_shadow_raw_fields():
+    record = LogRecord(cast(Any, make_log(0, 0)), blockNumber=7)
+    record["data"] = b"\x02"
+    record["logIndex"] = 5
+    del record["transactionHash"]
+
+    assert record["data"] == b"\x02"
+    assert record["logIndex"] == 5
+    assert "transactionHash" not in record
+    with pytest.raises(KeyError):
+        record["transactionHash"]
+    with pytest.raises(KeyError):
+        del record["transactionHash"]
+    assert dict(record) == {
+        "address": "0x" + "70" * 20,
+        "transactionIndex": 0,
+        "data": b"\x02",
+        "topics": [HexBytes("0x" + "33" * 32)],
+        "logIndex": 5,
+        "blockNumber": 7,
+    }
+
+
+def test_block_logs():
+    logs = map_block_logs(BLOCK)
+    assert [log["logIndex"] for log in logs] == [0, 1, 2]
+    assert all(log["blockNumber"] == 7 and log["blockHash"] == HexBytes(HASH) for log in logs)
+
+
+def test_receipts_get_their_logs():
+    receipts = BlockReceipts(BLOCK)
+    first, second = (receipts.get_receipt(tx) for tx in BLOCK["transactions"])
+
+    assert [log["logIndex"] for log in first["logs"]] == [0, 2]
+    assert [log["logIndex"] for log in second["logs"]] == [1]
+    assert first["value"] == 5
+    assert first["transactionHash"] == HexBytes(TX_HASH)
+    assert first["blockNumber"] == 7
@@ -0,0 +1,61 @@
+import pytest
+
+from ape_subsquid.metrics import Instrumentation, PrometheusExporter
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def instrumentation(events) -> Instrumentation:
+    instrumentation = Instrumentation()
+    instrumentation.add_hook(lambda event, fields: events.append((event, fields)))
+    return instrumentation
+
+
+def test_measure(instrumentation, events):
+    with instrumentation.measure("gateway.read", encoding="gzip") as event:
+        event["size"] = 10
+
+    [(name, fields)] = events
+    assert name == "gateway.read"
+    assert fields["encoding"] == "gzip"
+    assert fields["size"] == 10
+    assert fields["seconds"] >= 0
+    assert "error" not in fields
+
+
+def test_measure_failure(instrumentation, events):
+    with pytest.raises(ValueError):
+        with instrumentation.measure("engine.decode", query="event"):
+            raise ValueError("broken log")
+
+    [(name, fields)] = events
+    assert name == "engine.decode"
+    assert fields["error"] == "ValueError"
+    assert fields["query"] == "event"
+
+
+def test_nothing_is_measured_without_hooks():
+    instrumentation = Instrumentation()
+    with instrumentation.measure("gateway.read") as event:
+        event["size"] = 10
+    assert not instrumentation.enabled
+
+
+def test_prometheus_exporter():
+    exporter = PrometheusExporter(buckets=(0.1, 1.0))
+    exporter("gateway.response", {"worker": "https://w1", "status": "200", "seconds": 0.5})
+    exporter("gateway.response", {"worker": "https://w2", "status": "200", "seconds": 2.0})
+    exporter("gateway.read", {"size": 100, "wire_size": 20, "seconds": 0.05})
+
+    lines = exporter.render().splitlines()
+    assert "w1" not in exporter.render()
+    assert 'subsquid_gateway_response_total{status="200"} 2' in lines
+    assert 'subsquid_gateway_response_seconds_bucket{status="200",le="1.0"} 1' in lines
+    assert 'subsquid_gateway_response_seconds_bucket{status="200",le="+Inf"} 2' in lines
+    assert 'subsquid_gateway_response_seconds_sum{status="200"} 2.5' in lines
+    assert "subsquid_gateway_read_size_total 100" in lines
+    assert "subsquid_gateway_read_wire_size_total 20" in lines
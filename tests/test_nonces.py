@@ -0,0 +1,52 @@
+import pytest
+
+from ape_subsquid.nonces import NonceIndex, bisect_nonce_block
+
+NETWORK = "ethereum-mainnet"
+ACCOUNT = "0x" + "A1" * 20
+
+
+def get_nonce(block: int) -> int:
+    # one transaction every 10 blocks
+    return block // 10
+
+
+@pytest.mark.parametrize("nonce", [0, 1, 500, 99_999])
+def test_bisect_nonce_block(nonce):
+    block = bisect_nonce_block(get_nonce, nonce, 0, 1_000_000, resolution=100, max_steps=64)
+    # the transaction with the nonce is sent after the block and not far from it
+    assert get_nonce(block) <= nonce
+    assert nonce * 10 - block <= 100
+
+
+def test_bisect_nonce_block_stops_after_max_steps():
+    calls = []
+
+    def lookup(block: int) -> int:
+        calls.append(block)
+        return get_nonce(block)
+
+    block = bisect_nonce_block(lookup, 99_999, 0, 1_000_000, resolution=100, max_steps=3)
+    assert calls == [500_000, 750_000, 875_000]
+    assert block == 875_000
+
+
+def test_bisect_nonce_block_stops_at_failed_lookup():
+    def lookup(block: int) -> int:
+        if block < 500_000:
+            raise ValueError("missing trie node")
+        return get_nonce(block)
+
+    block = bisect_nonce_block(lookup, 10, 0, 1_000_000, resolution=100, max_steps=64)
+    assert block == 0
+
+
+def test_nonce_index(tmp_path):
+    index = NonceIndex(tmp_path / "nonces.sqlite", finality_margin=100)
+    index.put(NETWORK, ACCOUNT, [(0, 10), (5, 60), (9, 950)], height=1000)
+
+    assert index.get_closest(NETWORK, ACCOUNT.lower(), 7) == (5, 60)
+    assert index.get_closest(NETWORK, ACCOUNT, 0) == (0, 10)
+    # the block can still be reorganized
+    assert index.get_closest(NETWORK, ACCOUNT, 9) == (5, 60)
+    assert index.get_closest("other", ACCOUNT, 9) is None
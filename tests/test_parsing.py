@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from ape_subsquid import parsing
+from ape_subsquid.parsing import DecodeError, dumps, loads
+
+ITEMS = [
+    {"header": {"number": number, "hash": "0x%064x" % number}, "logs": [{"data": "0x"}] * 3}
+    for number in range(50)
+]
+
+
+def test_round_trip():
+    assert loads(dumps(ITEMS)) == ITEMS
+    assert json.loads(dumps(ITEMS)) == ITEMS
+
+
+def test_json_fallback(monkeypatch):
+    monkeypatch.setattr(parsing, "orjson", None)
+    assert parsing.dumps(ITEMS) == json.dumps(ITEMS, separators=(",", ":")).encode()
+
+
+def test_truncated_body_raises():
+    body = dumps(ITEMS)
+    with pytest.raises(DecodeError):
+        loads(body[:-10])
+    with pytest.raises(DecodeError):
+        json.loads(body[:-10])
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from ape_subsquid.exceptions import ApeSubsquidError, WorkerIsUnavailable
+from ape_subsquid.gateway import SubsquidGateway
+from ape_subsquid.parsing import loads
+from ape_subsquid.retry import CircuitBreaker, RetryPolicy, get_retry_after
+
+NETWORK = "ethereum-mainnet"
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr("ape_subsquid.retry.monotonic", clock)
+    return clock
+
+
+def test_retry_policy():
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    assert policy.should_retry(None)
+    assert policy.should_retry(503)
+    assert not policy.should_retry(400)
+
+    for retries in range(3):
+        assert 2**retries <= policy.get_pause(retries) <= 2**retries * 1.5
+    assert policy.get_pause(10) <= 15
+    assert policy.get_pause(0, retry_after=3) == 3
+    assert policy.get_pause(0, retry_after=300) == 10
+
+
+def test_get_retry_after():
+    assert get_retry_after({}) is None
+    assert get_retry_after({"Retry-After": "7"}) == 7
+    assert get_retry_after({"Retry-After": "soon"}) is None
+
+    date = datetime.now(timezone.utc) + timedelta(seconds=30)
+    retry_after = get_retry_after({"Retry-After": format_datetime(date)})
+    assert retry_after is not None and 25 < retry_after <= 30
+    past = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert get_retry_after({"Retry-After": format_datetime(past)}) == 0
+
+
+def test_circuit_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure("w1")
+    assert not breaker.is_open("w1")
+    breaker.record_success("w1")
+    breaker.record_failure("w1")
+    assert not breaker.is_open("w1")
+
+    breaker.record_failure("w1")
+    assert breaker.is_open("w1")
+    assert not breaker.is_open("w2")
+    clock.now += 20
+    assert breaker.get_reset_in("w1") == 40
+
+    # a single trial request, its failure opens the circuit again
+    clock.now += 40
+    assert not breaker.is_open("w1")
+    breaker.record_failure("w1")
+    assert breaker.is_open("w1")
+
+    clock.now += 60
+    assert not breaker.is_open("w1")
+    breaker.record_success("w1")
+    breaker.record_failure("w1")
+    assert not breaker.is_open("w1")
+
+
+class FakeWorkersGateway(SubsquidGateway):
+    _retry_policy = RetryPolicy(max_retries=2, base_delay=0)
+
+    def __init__(self, workers: list[str]) -> None:
+        super().__init__()
+        self.workers = workers
+        self.resolved: list[str] = []
+        self.posted: list[str] = []
+
+    def _get_worker(self, network, start_block):
+        worker = self.workers[len(self.resolved) % len(self.workers)]
+        self.resolved.append(worker)
+        return worker
+
+    def _post(self, worker_url, query, read):
+        self.posted.append(worker_url)
+        return [{"header": {"number": query["fromBlock"]}}], None
+
+
+def test_open_workers_are_not_resolved(clock):
+    gateway = FakeWorkersGateway(["w1", "w2"])
+    for _ in range(3):
+        gateway._breaker.record_failure("w1")
+
+    gateway._retry(gateway._query, NETWORK, {"fromBlock": 0})
+    assert gateway.resolved == ["w1", "w2"]
+    assert gateway.posted == ["w2"]
+
+
+def test_retry_waits_for_open_worker(clock, monkeypatch):
+    pauses = []
+    monkeypatch.setattr("ape_subsquid.gateway.sleep", pauses.append)
+    gateway = FakeWorkersGateway(["w1"])
+    for _ in range(3):
+        gateway._breaker.record_failure("w1")
+    clock.now += 15
+
+    with pytest.raises(WorkerIsUnavailable):
+        gateway._retry(gateway._query, NETWORK, {"fromBlock": 0})
+    assert gateway.posted == []
+    assert pauses == [45, 45]
+    assert len(gateway.resolved) == 3 * gateway._worker_resolutions
+
+
+def test_truncated_body_is_retried():
+    gateway = FakeWorkersGateway(["w1"])
+    attempts = []
+
+    def query(network, query):
+        attempts.append(query)
+        if len(attempts) < 3:
+            loads(b'[{"header": {"number": 1')
+        return "done"
+
+    assert gateway._retry(query, NETWORK, {"fromBlock": 0}) == "done"
+
+    attempts.clear()
+    gateway._retry_policy = RetryPolicy(max_retries=1, base_delay=0)
+    with pytest.raises(ApeSubsquidError):
+        gateway._retry(query, NETWORK, {"fromBlock": 0})
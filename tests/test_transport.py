@@ -0,0 +1,115 @@
+import asyncio
+import importlib.util
+import json
+import zlib
+
+import pytest
+from archive import TOKEN, TRANSFER_TOPIC, ArchiveConfig, FakeArchive
+
+from ape_subsquid.gateway import Query, SubsquidGateway
+from ape_subsquid.transport import get_accept_encoding, get_decoder
+
+QUERY: Query = {
+    "fromBlock": 1,
+    "toBlock": 200,
+    "fields": {"log": {"logIndex": True, "data": True, "topics": True}},
+    "logs": [{"address": [TOKEN], "topic0": [TRANSFER_TOPIC]}],
+}
+
+
+@pytest.mark.parametrize(
+    "encoding",
+    [
+        "gzip",
+        pytest.param(
+            "zstd",
+            marks=pytest.mark.skipif(
+                importlib.util.find_spec("zstandard") is None
+                or "zstd" not in get_accept_encoding(),
+                reason="zstd isn't supported",
+            ),
+        ),
+    ],
+)
+def test_compressed_response(encoding):
+    config = ArchiveConfig(height=1000, logs=10, compression=encoding)
+    with FakeArchive(config) as archive:
+        gateway = SubsquidGateway()
+        gateway._archive_url = archive.url
+        data = gateway.query("ethereum-mainnet", QUERY.copy())
+        expected = archive.query(QUERY)
+        sent = archive.sent
+
+    assert data == expected
+    stats = gateway.transfer.total
+    assert stats.size == len(json.dumps(expected).encode())
+    assert stats.wire_size == sent
+    # synthetic blocks are repetitive, so they compress well
+    assert stats.size / stats.wire_size > 5
+
+
+def test_uncompressed_response():
+    with FakeArchive(ArchiveConfig(height=1000, logs=10)) as archive:
+        gateway = SubsquidGateway()
+        gateway._archive_url = archive.url
+        data = gateway.query("ethereum-mainnet", QUERY.copy())
+        sent = archive.sent
+
+    assert len(data) == 200
+    stats = gateway.transfer.total
+    assert stats.size == stats.wire_size == sent
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_async_response(compression):
+    aio = pytest.importorskip("ape_subsquid.aio")
+    config = ArchiveConfig(height=1000, logs=10, compression=compression)
+    with FakeArchive(config) as archive:
+        gateway = aio.AsyncSubsquidGateway()
+        gateway._archive_url = archive.url
+
+        async def query():
+            try:
+                return await gateway.query("ethereum-mainnet", QUERY.copy())
+            finally:
+                await gateway.close()
+
+        data = asyncio.run(query())
+        expected = archive.query(QUERY)
+        sent = archive.sent
+
+    assert data == expected
+    stats = gateway.transfer.total
+    assert stats.size == len(json.dumps(expected).encode())
+    assert stats.wire_size == sent
+
+
+def test_async_session_is_closed_with_its_loop():
+    aio = pytest.importorskip("ape_subsquid.aio")
+    with FakeArchive(ArchiveConfig(height=1000)) as archive:
+        gateway = aio.AsyncSubsquidGateway()
+        gateway._archive_url = archive.url
+        asyncio.run(gateway.get_height("ethereum-mainnet"))
+        session = gateway._session
+        asyncio.run(gateway.get_height("ethereum-mainnet", refresh=True))
+        asyncio.run(gateway.close())
+
+    assert session is not None and session.closed
+    assert gateway._session is None
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "deflate"])
+def test_decoder(encoding):
+    body = json.dumps(list(range(1000))).encode()
+    compressor = zlib.compressobj(
+        wbits=16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS
+    )
+    encoded = compressor.compress(body) + compressor.flush()
+
+    decoder = get_decoder(encoding)
+    assert decoder is not None
+    chunks = [encoded[start:][:100] for start in range(0, len(encoded), 100)]
+    assert b"".join(decoder.decompress(chunk) for chunk in chunks) + decoder.flush() == body
+    assert get_decoder("identity") is None
+    with pytest.raises(ValueError):
+        get_decoder("compress")
@@ -0,0 +1,172 @@
+import time
+
+import pytest
+
+from ape_subsquid import utils
+from ape_subsquid.utils import (
+    batched,
+    iterate_in_background,
+    split_overlapping_ranges,
+    split_range,
+    ttl_cache,
+)
+
+
+@pytest.mark.parametrize(
+    "start,stop,parts,min_size,expected",
+    [
+        (0, 9, 2, 1, [(0, 4), (5, 9)]),
+        (0, 10, 3, 1, [(0, 3), (4, 7), (8, 10)]),
+        (5, 5, 4, 1, [(5, 5)]),
+        (0, 99, 4, 50, [(0, 49), (50, 99)]),
+        (0, 9, 4, 100, [(0, 9)]),
+    ],
+)
+def test_split_range(start, stop, parts, min_size, expected):
+    assert split_range(start, stop, parts, min_size) == expected
+
+
+def test_split_overlapping_ranges():
+    assert split_overlapping_ranges([(1, 100), (1, 100)]) == [(1, 100, [0, 1])]
+    assert split_overlapping_ranges([(50, 150), (1, 100), (200, 300)]) == [
+        (1, 49, [1]),
+        (50, 100, [0, 1]),
+        (101, 150, [0]),
+        (200, 300, [2]),
+    ]
+    # a range within another one
+    assert split_overlapping_ranges([(1, 100), (10, 10)]) == [
+        (1, 9, [0]),
+        (10, 10, [0, 1]),
+        (11, 100, [0]),
+    ]
+
+
+def test_batched():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
+    # items are consumed lazily
+    assert next(batched(iter(range(10**12)), 2)) == [0, 1]
+
+
+def test_background_iterator_yields_in_order():
+    assert list(iterate_in_background(iter(range(100)), 3)) == list(range(100))
+
+
+def test_background_iterator_raises_error():
+    def fail():
+        yield 1
+        yield 2
+        raise ValueError("broken")
+
+    items = iterate_in_background(fail(), 1)
+    assert next(items) == 1
+    assert next(items) == 2
+    with pytest.raises(ValueError, match="broken"):
+        next(items)
+    with pytest.raises(StopIteration):
+        next(items)
+
+
+def test_background_iterator_close_stops_producer():
+    produced = []
+
+    def produce():
+        for item in range(1000):
+            produced.append(item)
+            yield item
+
+    items = iterate_in_background(produce(), 2)
+    assert next(items) == 0
+    items.close()
+    items._thread.join(timeout=5)
+    assert not items._thread.is_alive()
+    assert len(produced) < 1000
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(utils.time, "monotonic", clock)
+    return clock
+
+
+class Heights:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+        self.height = 100
+
+    @ttl_cache(seconds=30, stale_seconds=600, ignore=("max_retries",))
+    def get_height(self, network: str, **kwargs) -> int:
+        self.calls.append(network)
+        return self.height
+
+
+def wait_for_height(heights: Heights, height: int) -> int:
+    deadline = time.perf_counter() + 5
+    while time.perf_counter() < deadline:
+        value = heights.get_height("mainnet")
+        if value == height:
+            break
+        time.sleep(0.01)
+    return value
+
+
+def test_ttl_cache_is_per_network(clock):
+    heights = Heights()
+    assert heights.get_height("mainnet") == 100
+    assert heights.get_height("sepolia") == 100
+    assert heights.get_height("mainnet") == 100
+    assert heights.calls == ["mainnet", "sepolia"]
+
+
+def test_ttl_cache_ignores_excluded_arguments(clock):
+    heights = Heights()
+    heights.get_height("mainnet", max_retries=1)
+    heights.get_height("mainnet", max_retries=5)
+    heights.get_height("mainnet")
+    assert heights.calls == ["mainnet"]
+
+
+def test_ttl_cache_refresh(clock):
+    heights = Heights()
+    heights.get_height("mainnet")
+    heights.height = 101
+    assert heights.get_height("mainnet", refresh=True) == 101
+    # the refreshed value is cached
+    assert heights.get_height("mainnet") == 101
+    assert heights.calls == ["mainnet", "mainnet"]
+
+
+def test_ttl_cache_serves_stale_values_while_refreshing(clock):
+    heights = Heights()
+    heights.get_height("mainnet")
+    heights.height = 101
+
+    clock.now += 31
+    # the stale value is returned right away and refreshed in the background
+    assert heights.get_height("mainnet") == 100
+    assert wait_for_height(heights, 101) == 101
+    # a single refresh was started
+    assert len(heights.calls) == 2
+
+
+def test_ttl_cache_expires(clock):
+    heights = Heights()
+    heights.get_height("mainnet")
+    heights.height = 101
+
+    clock.now += 29
+    assert heights.get_height("mainnet") == 100
+    # past the stale period the value is fetched before returning
+    clock.now += 30 + 600
+    assert heights.get_height("mainnet") == 101
+    assert heights.calls == ["mainnet", "mainnet"]